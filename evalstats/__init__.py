@@ -3,11 +3,23 @@
 
 from .__version__ import __version__
 from .evalstats import EvalStats
+from .cache import ResultCache
+from .accumulator import Accumulator
+from .accumulator import tree_reduce
+from .sketch import Histogram
+from .sketch import HyperLogLog
+from .sketch import Summary
 
 __author__ = ['Nico Curti']
 __email__ = ['nico.curti2@unibo.it']
 
 __all__ = [
 	'__version__',
-  'EvalStats'
+  'EvalStats',
+  'ResultCache',
+  'Accumulator',
+  'tree_reduce',
+  'Histogram',
+  'HyperLogLog',
+  'Summary',
 ]
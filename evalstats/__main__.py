@@ -3,11 +3,22 @@
 
 import sys
 import json
+import math
 import argparse
 import platform
+from functools import partial
 from time import time as now
 from evalstats import EvalStats
 from evalstats import __version__
+from evalstats import Accumulator
+from evalstats import tree_reduce
+from evalstats.sketch import Summary
+from evalstats.cache import ResultCache
+from evalstats.cache import fingerprint_file
+from evalstats.reader import expand_inputs
+from evalstats.reader import reduce_files
+from evalstats.reader import map_reduce
+from evalstats.stream import stream
 
 __author__ = ['Nico Curti']
 __email__ = ['nico.curti2@unibo.it']
@@ -19,6 +30,8 @@ VIOLET_COLOR_CODE = '\033[38;5;141m'
 RED_COLOR_CODE    = '\033[38;5;196m'
 CRLF              = '\r\x1B[K' if platform.system() != 'Windows' else '\r\x1b[2K'
 
+STATISTICS = ('mean', 'std', 'min', 'max', 'count', 'sum', 'variance')
+
 def parse_args():
   '''
   Parse command line arguments for the evalstats package.
@@ -67,21 +80,128 @@ def parse_args():
     ),
   )
 
-  # evalstats --input <file>
-  # This option allows the user to specify an input file from which to read the data.
+  # evalstats --input <file> [<file> ...]
+  # This option allows the user to specify the input files from which to read the data.
+  # Each entry could be a filename, a glob pattern or a directory.
   # If both 'data' and 'input' are provided, 'data' will take precedence.
   parser.add_argument(
     '--input', '-i',
     dest='input',
     type=str,
+    nargs='+',
     required=False,
     default=None,
     help=(
-      'The input file from which to read the data. '
+      'The input files from which to read the data. '
+      'Each entry could be a filename, a glob pattern (e.g. "data/*.csv") '
+      'or a directory. Compressed files (.csv.gz, .csv.bz2, .csv.xz) are '
+      'decoded on the fly. Files are processed concurrently and their statistics '
+      'are merged together. '
       'If not provided, data must be passed as a positional argument.'
     ),
   )
+
+  # evalstats --per-file
+  # This option allows the user to report also the statistics of each input file.
+  parser.add_argument(
+    '--per-file', '-f',
+    dest='per_file',
+    action='store_true',
+    default=False,
+    help='Report also the statistics of each input file, besides the merged ones.',
+  )
   
+  # evalstats --merge-partials <file> [<file> ...]
+  # This option allows the user to merge the partial statistics
+  # previously saved with --emit-partial (e.g. by other hosts).
+  parser.add_argument(
+    '--merge-partials', '-P',
+    dest='merge_partials',
+    type=str,
+    nargs='+',
+    required=False,
+    default=None,
+    help=(
+      'The partial statistics files (see --emit-partial) to merge. '
+      'They are merged also with the statistics of the --input files, if any.'
+    ),
+  )
+
+  # evalstats --emit-partial <file>
+  # This option allows the user to save the mergeable partial statistics
+  # of the data, so that they could be merged later with --merge-partials.
+  parser.add_argument(
+    '--emit-partial', '-e',
+    dest='emit_partial',
+    type=str,
+    required=False,
+    default=None,
+    help=(
+      'The output file in which to save the binary encoding of the partial '
+      'statistics of the data, to be merged later with --merge-partials.'
+    ),
+  )
+
+  # evalstats --stream
+  # This option allows the user to compute progressive statistics
+  # of an unbounded stream of numbers read from stdin.
+  parser.add_argument(
+    '--stream',
+    dest='stream',
+    action='store_true',
+    default=False,
+    help=(
+      'Read an unbounded stream of numbers from stdin and print a JSON line '
+      'with the current statistics every --every records or --interval seconds. '
+      'Tokens which are not numbers are skipped and reported as invalid. '
+      'It cannot be combined with the other data sources, --histogram and --distinct. '
+      'Example: tail -f metrics | evalstats --stream'
+    ),
+  )
+
+  # evalstats --every <int>
+  parser.add_argument(
+    '--every',
+    dest='every',
+    type=int,
+    required=False,
+    default=1000,
+    help='The number of new records after which the stream statistics are printed. Default is 1000.',
+  )
+
+  # evalstats --interval <float>
+  parser.add_argument(
+    '--interval',
+    dest='interval',
+    type=float,
+    required=False,
+    default=1.,
+    help='The number of seconds after which the stream statistics are printed. Default is 1.',
+  )
+
+  # evalstats --window <int>
+  parser.add_argument(
+    '--window',
+    dest='window',
+    type=int,
+    required=False,
+    default=None,
+    help='Compute the stream statistics on the last WINDOW records only.',
+  )
+
+  # evalstats --decay <float>
+  parser.add_argument(
+    '--decay',
+    dest='decay',
+    type=float,
+    required=False,
+    default=None,
+    help=(
+      'Compute exponentially weighted stream statistics, with the weight of '
+      'each record decaying by a factor (1 - DECAY) at each new record.'
+    ),
+  )
+
   # evalstats --num-workers <int>
   # This option allows the user to specify the number of worker threads 
   # to use for parallel computation.
@@ -94,6 +214,22 @@ def parse_args():
     help='The number of worker threads to use for parallel computation. Default is 4.',
   )
 
+  # evalstats --num-processes <int>
+  # This option allows the user to reduce the input files using
+  # multiple processes instead of the threads of a single process.
+  parser.add_argument(
+    '--num-processes', '-p',
+    dest='num_processes',
+    type=int,
+    required=False,
+    default=1,
+    help=(
+      'The number of worker processes used to reduce the input files. '
+      'If greater than 1, each process reduces a file and sends back its '
+      'partial statistics to be merged. Default is 1.'
+    ),
+  )
+
   # evalstats --mean
   # This option allows the user to compute the mean of the data.
   parser.add_argument(
@@ -174,6 +310,41 @@ def parse_args():
     help='Compute all statistics (mean, std, min, max, count, sum, variance).',
   )
 
+  # evalstats --histogram <int>
+  # This option allows the user to compute the histogram of the data.
+  parser.add_argument(
+    '--histogram', '-H',
+    dest='histogram',
+    type=int,
+    required=False,
+    default=None,
+    help=(
+      'Compute the histogram of the data with the given number of equally spaced bins. '
+      'The bins span --range, or the minimum and maximum of the data found in the same pass.'
+    ),
+  )
+
+  # evalstats --range <lo> <hi>
+  parser.add_argument(
+    '--range', '-R',
+    dest='range',
+    type=float,
+    nargs=2,
+    required=False,
+    default=None,
+    help='The lower and upper edges of the histogram bins. It is required for --input files.',
+  )
+
+  # evalstats --distinct
+  # This option allows the user to compute the approximate distinct count of the data.
+  parser.add_argument(
+    '--distinct', '-D',
+    dest='distinct',
+    action='store_true',
+    default=False,
+    help='Compute the approximate number of distinct values of the data (HyperLogLog).',
+  )
+
   # evalstats --output <file>
   parser.add_argument(
     '--output', '-o',
@@ -187,6 +358,44 @@ def parse_args():
     ),
   )
 
+  # evalstats --no-cache
+  # This option allows the user to disable the on-disk cache of the results.
+  parser.add_argument(
+    '--no-cache',
+    dest='no_cache',
+    action='store_true',
+    default=False,
+    help='Do not use the on-disk cache of the results.',
+  )
+
+  # evalstats --cache-dir <dir>
+  # This option allows the user to set the directory of the on-disk cache.
+  parser.add_argument(
+    '--cache-dir',
+    dest='cache_dir',
+    type=str,
+    required=False,
+    default=None,
+    help=(
+      'The directory of the on-disk cache of the results. '
+      'Default is $EVALSTATS_CACHE_DIR or ~/.cache/evalstats.'
+    ),
+  )
+
+  # evalstats --cache-hash
+  # This option allows the user to identify the input files by the hash
+  # of their content instead of their size and modification time.
+  parser.add_argument(
+    '--cache-hash',
+    dest='cache_hash',
+    action='store_true',
+    default=False,
+    help=(
+      'Identify the cached input files also by the hash of their content, '
+      'besides their path, size and modification time.'
+    ),
+  )
+
   # evalstats --version
   parser.add_argument(
     '--version', '-v',
@@ -199,11 +408,114 @@ def parse_args():
 
   return parser
 
+def select_statistics(stats : dict, args : argparse.Namespace) -> dict:
+  '''
+  Filter the computed statistics according to the command line flags.
+
+  Parameters
+  ----------
+  stats : dict
+    The dictionary of all the computed statistics.
+
+  args : argparse.Namespace
+    The parsed command line arguments.
+
+  Returns
+  -------
+  dict
+    The dictionary of the statistics requested by the user. All of them
+    are returned if the --all flag is set.
+  '''
+  if args.all:
+    return dict(stats)
+  return {
+    key: value
+    for key, value in stats.items()
+    if getattr(args, key, False)
+  }
+
+def stream_statistics(args : argparse.Namespace) -> None:
+  '''
+  Print the progressive statistics of the stream of numbers read from
+  stdin as JSON lines, to stdout or to the output file.
+
+  Parameters
+  ----------
+  args : argparse.Namespace
+    The parsed command line arguments.
+  '''
+  # the stream is the only source of data and only the
+  # running statistics are computed on it
+  ignored = [
+    flag
+    for flag, value in (
+      ('--data', args.data),
+      ('--input', args.input),
+      ('--merge-partials', args.merge_partials),
+      ('--emit-partial', args.emit_partial),
+      ('--per-file', args.per_file),
+      ('--histogram', args.histogram),
+      ('--range', args.range),
+      ('--distinct', args.distinct),
+    )
+    if value
+  ]
+  if ignored:
+    print(
+      f'{RED_COLOR_CODE}Error! --stream cannot be used with {", ".join(ignored)}.{RESET_COLOR_CODE}',
+      file=sys.stderr, flush=True
+    )
+    exit(1)
+
+  # the weighted statistics do not track the extrema and the sum
+  unsupported = [
+    f'--{k}'
+    for k in ('min', 'max', 'sum')
+    if args.decay is not None and getattr(args, k)
+  ]
+  if unsupported:
+    print(
+      f'{RED_COLOR_CODE}Error! --decay cannot be used with {", ".join(unsupported)}.{RESET_COLOR_CODE}',
+      file=sys.stderr, flush=True
+    )
+    exit(1)
+
+  fp = open(args.output, 'w') if args.output else sys.stdout
+  try:
+    for stats in stream(
+      sys.stdin.buffer,
+      every=args.every,
+      interval=args.interval,
+      window=args.window,
+      alpha=args.decay,
+    ):
+      # the selected statistics are printed, if any
+      # together with the number of skipped invalid tokens
+      if not args.all and any(getattr(args, k) for k in STATISTICS):
+        stats = dict(select_statistics(stats, args), invalid=stats['invalid'])
+      print(json.dumps(stats, sort_keys=True), file=fp, flush=True)
+  except ValueError as err:
+    print(
+      f'{RED_COLOR_CODE}Error! {err}{RESET_COLOR_CODE}',
+      file=sys.stderr, flush=True
+    )
+    exit(1)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    if fp is not sys.stdout:
+      fp.close()
+
 def main ():
   # extract the arguments of the cmd
   parser = parse_args()
   args = parser.parse_args()
   
+  # the stream statistics are printed as JSON lines
+  if args.stream:
+    stream_statistics(args)
+    exit(0)
+
   # source: https://patorjk.com/software/taag
   print(fr'''{VIOLET_COLOR_CODE}
                  _     _        _       
@@ -227,11 +539,15 @@ def main ():
   # create a data array if the user provided it
   data = args.data    
 
+  # list of the input files and of the partial statistics files
+  filenames = []
+  partial_files = args.merge_partials or []
+
   # check if the user wants to use an in
   # input file or a data array
-  if data is None and args.input is None:
+  if data is None and args.input is None and not partial_files:
     print(
-      f'{RED_COLOR_CODE}Error! You must provide either data or an input file.{RESET_COLOR_CODE}', 
+      f'{RED_COLOR_CODE}Error! You must provide either data, an input file or partial statistics.{RESET_COLOR_CODE}', 
       file=sys.stderr, flush=True
     )
     print(parser.print_help(), file=sys.stdout, flush=True)    
@@ -258,56 +574,214 @@ def main ():
         f'{ORANGE_COLOR_CODE}Using provided data array{RESET_COLOR_CODE}',
         file=sys.stdout, flush=True
       )
-  # check if the user wants to use an input file
+  # check if the user wants to use the input files
   elif args.input is not None:
-    # check if the input file exists and can be opened
-    if not args.input.endswith('.csv'):      
+    # expand globs and directories into the list of files
+    # and check that all of them exist and are supported
+    try:
+      filenames = expand_inputs(args.input)
+    except (FileNotFoundError, ValueError) as err:
+      print(
+        f'{RED_COLOR_CODE}Error! {err}.{RESET_COLOR_CODE}',
+        file=sys.stderr, flush=True
+      )
+      exit(1)
+
+    print(
+      f'{ORANGE_COLOR_CODE}Using {len(filenames)} input file(s): {", ".join(filenames)}{RESET_COLOR_CODE}',
+      file=sys.stdout, flush=True
+    )
+
+  # the histogram and the distinct count are computed in the same scan
+  # of the statistics, keeping the default precision of the sketch
+  sketches = args.histogram is not None or args.distinct
+  precision = 12 if args.distinct else None
+
+  # check the options of the histogram before reading any data
+  if args.histogram is not None and args.histogram <= 0:
+    print(
+      f'{RED_COLOR_CODE}Error! --histogram must be a positive number of bins.{RESET_COLOR_CODE}',
+      file=sys.stderr, flush=True
+    )
+    exit(1)
+  if args.range is not None and not (
+    math.isfinite(args.range[0]) and math.isfinite(args.range[1]) and args.range[0] <= args.range[1]
+  ):
+    print(
+      f'{RED_COLOR_CODE}Error! --range must be a finite interval LO <= HI.{RESET_COLOR_CODE}',
+      file=sys.stderr, flush=True
+    )
+    exit(1)
+
+  if data is None and sketches:
+    # the partial statistics files store only the moments
+    if partial_files:
+      print(
+        f'{RED_COLOR_CODE}Error! --histogram and --distinct cannot be used with --merge-partials.{RESET_COLOR_CODE}',
+        file=sys.stderr, flush=True
+      )
+      exit(1)
+    # the files are streamed, thus the bins must be known in advance
+    if args.histogram is not None and args.range is None:
       print(
-        f'{RED_COLOR_CODE}Error! Input file must be a CSV file.{RESET_COLOR_CODE}',
+        f'{RED_COLOR_CODE}Error! --histogram of --input files requires --range.{RESET_COLOR_CODE}',
         file=sys.stderr, flush=True
       )
       exit(1)
-    # try to open the input file to check if it exists
+    if args.num_processes > 1:
+      print(
+        f'{ORANGE_COLOR_CODE}Warning! --histogram and --distinct are computed using threads only.{RESET_COLOR_CODE}',
+        file=sys.stdout, flush=True
+      )
+
+  # check if the user wants to merge partial statistics
+  if data is None and partial_files:
+    print(
+      f'{ORANGE_COLOR_CODE}Merging {len(partial_files)} partial statistics file(s): {", ".join(partial_files)}{RESET_COLOR_CODE}',
+      file=sys.stdout, flush=True
+    )
+
+  # set the on-disk cache of the results
+  cache = None if args.no_cache else ResultCache(cache_dir=args.cache_dir)
+
+  # look for the results of the same request in the cache,
+  # identifying the input files by their fingerprint
+  # the partial statistics to emit are not cached
+  results = None
+  accumulator = None
+  if data is None and cache is not None and args.emit_partial is None:
     try:
-      # read the input file
-      with open(args.input, 'r') as fp:
-        # read the data from the file
-        # split the lines 
-        data = fp.read().splitlines()
-
-      # convert the data to a list of floats
-      data = [
-        [
-          float(x) 
-          for x in row.strip().split(',')
-        ] 
-        for row in data
-      ]
-    except FileNotFoundError:
+      key = cache.make_key(
+        inputs=[
+          fingerprint_file(f, content_hash=args.cache_hash)
+          for f in filenames + partial_files
+        ],
+        statistics=[
+          k
+          for k in STATISTICS
+          if args.all or getattr(args, k)
+        ],
+        per_file=args.per_file,
+        histogram=args.histogram,
+        range=args.range,
+        distinct=args.distinct,
+      )
+    except OSError as err:
       print(
-        f'{RED_COLOR_CODE}Error! Input file {args.input} not found.{RESET_COLOR_CODE}',
+        f'{RED_COLOR_CODE}Error! Cannot read the input files: {err}{RESET_COLOR_CODE}',
         file=sys.stderr, flush=True
       )
       exit(1)
-    
+    results = cache.get(key)
+
+  if results is not None:
+    # log the time taken to retrieve the statistics
+    toc = now()
     print(
-      f'{ORANGE_COLOR_CODE}Using input file: {args.input}{RESET_COLOR_CODE}',
+      f'{GREEN_COLOR_CODE}[CACHED]{RESET_COLOR_CODE} took {toc - tic:.2f} seconds.',
       file=sys.stdout, flush=True
     )
+  # the input files are read and reduced concurrently
+  # and their partial statistics merged together
+  elif data is None:
+    print(
+      f'Computing statistics of {len(filenames) + len(partial_files)} file(s)... ',
+      file=sys.stdout, flush=True, end='',
+    )
+    per_file = {}
+    try:
+      # reduce the input files using threads or processes
+      if filenames and args.num_processes > 1 and not sketches:
+        _, per_file = map_reduce(
+          filenames=filenames,
+          num_processes=args.num_processes,
+        )
+      elif filenames:
+        # the sketches are updated only if required, so that the
+        # partials could be merged with the decoded ones below
+        _, per_file = reduce_files(
+          filenames=filenames,
+          num_workers=args.num_workers,
+          factory=partial(
+            Summary,
+            bins=args.histogram,
+            range=args.range,
+            precision=precision,
+          ) if sketches else Accumulator,
+        )
+      # decode the partial statistics files
+      for f in partial_files:
+        with open(f, 'rb') as fp:
+          per_file[f] = Accumulator.from_bytes(fp.read())
+    except (OSError, ValueError) as err:
+      print(
+        f'\n{RED_COLOR_CODE}Error! Cannot read the input files: {err}{RESET_COLOR_CODE}',
+        file=sys.stderr, flush=True
+      )
+      exit(1)
+    accumulator = tree_reduce(list(per_file.values()))
+    results = select_statistics(accumulator.to_dict(), args)
+    # add the per-file breakdown if required
+    if args.per_file:
+      results['files'] = {
+        f: select_statistics(v.to_dict(), args)
+        for f, v in per_file.items()
+      }
+    # store the results for the next runs
+    if cache is not None:
+      cache.put(key, results)
 
-  # create an instance of the EvalStats class  
-  eval_stats = EvalStats(
-    data=data,
-    num_workers=args.num_workers,
-  )
+    # log the time taken to compute the statistics
+    toc = now()
+    print(
+      f'{GREEN_COLOR_CODE}[DONE]{RESET_COLOR_CODE} took {toc - tic:.2f} seconds.',
+      file=sys.stdout, flush=True
+    )
+  # compute the statistics, the histogram and the
+  # distinct count of the data array in a single scan
+  elif sketches:
+    # create an instance of the EvalStats class
+    eval_stats = EvalStats(
+      data=data,
+      num_workers=args.num_workers,
+    )
+    print(
+      'Computing selected statistics... ', 
+      file=sys.stdout, flush=True, end='',
+    )
+    try:
+      stats = eval_stats.scan(
+        bins=args.histogram,
+        range=args.range,
+        precision=precision,
+      )
+    except ValueError as err:
+      print(
+        f'\n{RED_COLOR_CODE}Error! {err}{RESET_COLOR_CODE}',
+        file=sys.stderr, flush=True
+      )
+      exit(1)
+    results = select_statistics(stats, args)
 
+    # log the time taken to compute the statistics
+    toc = now()
+    print(
+      f'{GREEN_COLOR_CODE}[DONE]{RESET_COLOR_CODE} took {toc - tic:.2f} seconds.',
+      file=sys.stdout, flush=True
+    )
   # compute the statistics based on the provided arguments
-  if args.all:
+  elif args.all:
+    # create an instance of the EvalStats class
+    eval_stats = EvalStats(
+      data=data,
+      num_workers=args.num_workers,
+      cache=cache,
+    )
     print(
       'Computing all statistics... ', 
       file=sys.stdout, flush=True, end='',
     )
-    results = eval_stats.compute_all()
+    results = eval_stats.all
     
     # log the time taken to compute the statistics
     toc = now()
@@ -316,25 +790,31 @@ def main ():
       file=sys.stdout, flush=True
     )
   else:
+    # create an instance of the EvalStats class
+    eval_stats = EvalStats(
+      data=data,
+      num_workers=args.num_workers,
+      cache=cache,
+    )
     print(
       'Computing selected statistics...', 
       file=sys.stdout, flush=True, end='',
     )
     results = {}
     if args.mean:
-      results['mean'] = eval_stats.mean()
+      results['mean'] = eval_stats.mean
     if args.std:
-      results['std'] = eval_stats.std()
+      results['std'] = eval_stats.std
     if args.min:
-      results['min'] = eval_stats.min()
+      results['min'] = eval_stats.min
     if args.max:
-      results['max'] = eval_stats.max()
+      results['max'] = eval_stats.max
     if args.count:
-      results['count'] = eval_stats.count()
+      results['count'] = eval_stats.count
     if args.sum:
-      results['sum'] = eval_stats.sum()
+      results['sum'] = eval_stats.sum
     if args.variance:
-      results['variance'] = eval_stats.variance()
+      results['variance'] = eval_stats.variance
 
     # log the time taken to compute the statistics
     toc = now()
@@ -343,6 +823,20 @@ def main ():
       file=sys.stdout, flush=True
     )
 
+  # save the partial statistics to be merged later
+  if args.emit_partial:
+    if accumulator is None:
+      accumulator = Accumulator.from_array(data)
+    # only the moments are stored in the partial statistics
+    elif isinstance(accumulator, Summary):
+      accumulator = accumulator.stats
+    with open(args.emit_partial, 'wb') as fp:
+      fp.write(accumulator.to_bytes())
+    print(
+      f'Partial statistics saved to {args.emit_partial}',
+      file=sys.stdout, flush=True
+    )
+
   # print the results
   if args.output:
     print(
@@ -0,0 +1,238 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import struct
+import numpy as np
+
+__author__ = ['Nico Curti']
+__email__ = ['nico.curti2@unibo.it']
+
+__all__ = [
+  'Accumulator',
+  'tree_reduce',
+]
+
+class Accumulator:
+  '''
+  Mergeable partial statistics of a set of data.
+  The accumulator stores the count, mean, sum of squared deviations from
+  the mean (M2), minimum and maximum of the data, which could be exactly
+  combined with the ones of other sets of data using the pairwise update
+  of Chan et al. Accumulators could be serialized with a compact binary
+  encoding, so that partial statistics computed by different processes or
+  hosts could be merged together.
+
+  Further moments could be tracked by subclasses extending the _FIELDS
+  and _FORMAT attributes and overriding from_array and merge.
+
+  Parameters
+  ----------
+  count : int, optional (default=0)
+    The number of elements.
+
+  mean : float, optional (default=0.)
+    The mean of the elements.
+
+  m2 : float, optional (default=0.)
+    The sum of squared deviations from the mean.
+
+  min : float, optional (default=inf)
+    The minimum value.
+
+  max : float, optional (default=-inf)
+    The maximum value.
+  '''
+  # names of the stored fields, in order of serialization
+  _FIELDS = ('count', 'mean', 'm2', 'min', 'max')
+  # binary layout: magic, version and fields (little-endian)
+  _MAGIC = b'EVST'
+  _VERSION = 1
+  _FORMAT = '<4sBQdddd'
+
+  def __init__(self, count : int = 0, mean : float = 0., m2 : float = 0.,
+               min : float = np.inf, max : float = -np.inf):
+    self.count = int(count)
+    self.mean = float(mean)
+    self.m2 = float(m2)
+    self.min = float(min)
+    self.max = float(max)
+
+  @classmethod
+  def from_array(cls, x : np.ndarray) -> 'Accumulator':
+    '''
+    Reduce an array to its partial statistics.
+
+    Parameters
+    ----------
+    x : np.ndarray
+      The input data.
+
+    Returns
+    -------
+    Accumulator
+      The partial statistics of the data.
+    '''
+    x = np.asarray(x).ravel()
+    if len(x) == 0:
+      return cls()
+    mu = np.mean(x)
+    return cls(
+      count=len(x),
+      mean=mu,
+      m2=np.sum((x - mu) ** 2),
+      min=np.min(x),
+      max=np.max(x),
+    )
+
+  def merge(self, other : 'Accumulator') -> 'Accumulator':
+    '''
+    Merge two partial statistics.
+
+    Parameters
+    ----------
+    other : Accumulator
+      The partial statistics to merge with.
+
+    Returns
+    -------
+    Accumulator
+      The partial statistics of the union of the two sets of data.
+
+    Raises
+    -------
+    TypeError
+      If other is not an Accumulator.
+    '''
+    if not isinstance(other, Accumulator):
+      raise TypeError(f'Cannot merge {self.__class__.__name__} with {other.__class__.__name__}')
+    n = self.count + other.count
+    if n == 0:
+      return self.__class__()
+    delta = other.mean - self.mean
+    return self.__class__(
+      count=n,
+      mean=self.mean + delta * other.count / n,
+      m2=self.m2 + other.m2 + delta * delta * self.count * other.count / n,
+      min=min(self.min, other.min),
+      max=max(self.max, other.max),
+    )
+
+  def update(self, x : np.ndarray) -> 'Accumulator':
+    '''
+    Update the partial statistics with new values.
+
+    Parameters
+    ----------
+    x : np.ndarray
+      The new data.
+
+    Returns
+    -------
+    Accumulator
+      The updated accumulator (self).
+    '''
+    merged = self.merge(self.from_array(x))
+    self.__dict__.update(merged.__dict__)
+    return self
+
+  def __add__(self, other : 'Accumulator') -> 'Accumulator':
+    return self.merge(other)
+
+  def to_dict(self) -> dict:
+    '''
+    Convert the partial statistics into the dictionary of statistics.
+
+    Returns
+    -------
+    dict
+      A dictionary containing the mean, standard deviation, minimum,
+      maximum, count, total sum, and variance of the data.
+    '''
+    var = self.m2 / self.count if self.count else 0.
+    return {
+      'mean': self.mean,
+      'std': var ** 0.5,
+      'min': self.min,
+      'max': self.max,
+      'count': self.count,
+      'sum': self.mean * self.count,
+      'variance': var,
+    }
+
+  def to_bytes(self) -> bytes:
+    '''
+    Serialize the partial statistics.
+
+    Returns
+    -------
+    bytes
+      The binary encoding of the accumulator.
+    '''
+    return struct.pack(
+      self._FORMAT,
+      self._MAGIC,
+      self._VERSION,
+      *(getattr(self, f) for f in self._FIELDS)
+    )
+
+  @classmethod
+  def from_bytes(cls, buffer : bytes) -> 'Accumulator':
+    '''
+    Deserialize the partial statistics.
+
+    Parameters
+    ----------
+    buffer : bytes
+      The binary encoding of the accumulator (see to_bytes).
+
+    Returns
+    -------
+    Accumulator
+      The decoded accumulator.
+
+    Raises
+    -------
+    ValueError
+      If the buffer is not a valid encoding of the accumulator.
+    '''
+    if len(buffer) != struct.calcsize(cls._FORMAT):
+      raise ValueError(f'Invalid {cls.__name__} encoding: wrong size')
+    magic, version, *fields = struct.unpack(cls._FORMAT, buffer)
+    if magic != cls._MAGIC or version != cls._VERSION:
+      raise ValueError(f'Invalid {cls.__name__} encoding: wrong header')
+    return cls(**dict(zip(cls._FIELDS, fields)))
+
+  def __eq__(self, other):
+    if not isinstance(other, Accumulator):
+      return NotImplemented
+    return all(getattr(self, f) == getattr(other, f) for f in self._FIELDS)
+
+  def __repr__(self):
+    fields = ', '.join(f'{f}={getattr(self, f)}' for f in self._FIELDS)
+    return f"{self.__class__.__name__}({fields})"
+
+def tree_reduce(accumulators : list) -> Accumulator:
+  '''
+  Merge a list of partial statistics pairwise, as a balanced binary tree.
+  Compared to a sequential reduction, the tree limits the accumulation of
+  rounding errors when many partials are merged.
+
+  Parameters
+  ----------
+  accumulators : list
+    The list of partial statistics.
+
+  Returns
+  -------
+  Accumulator
+    The partial statistics of the union of all the sets of data.
+  '''
+  level = list(accumulators)
+  if not level:
+    return Accumulator()
+  while len(level) > 1:
+    level = [
+      level[i].merge(level[i + 1]) if i + 1 < len(level) else level[i]
+      for i in range(0, len(level), 2)
+    ]
+  return level[0]
@@ -0,0 +1,327 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import numpy as np
+from .__version__ import __version__
+
+__author__ = ['Nico Curti']
+__email__ = ['nico.curti2@unibo.it']
+
+__all__ = [
+  'CACHE_VERSION',
+  'DEFAULT_CACHE_DIR',
+  'ResultCache',
+  'fingerprint_file',
+  'fingerprint_array',
+]
+
+# default location of the on-disk cache
+DEFAULT_CACHE_DIR = os.environ.get(
+  'EVALSTATS_CACHE_DIR',
+  os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+    'evalstats'
+  )
+)
+
+# version of the layout of the cache entries, to be increased whenever
+# a change in the code invalidates the previously cached results
+CACHE_VERSION = 1
+
+# default maximum size (in bytes) of the on-disk cache
+DEFAULT_CACHE_SIZE = 32 << 20
+
+# default maximum number of entries of the on-disk cache
+DEFAULT_CACHE_ENTRIES = 4096
+
+# fraction of the limits kept after an eviction, so that the
+# following writes do not trigger a new eviction right away
+_LOW_WATER = 0.9
+
+def _disk_usage(info : os.stat_result) -> int:
+  '''
+  Get the space allocated on disk by a file, which for small entries is
+  a whole filesystem block rather than their size.
+
+  Parameters
+  ----------
+  info : os.stat_result
+    The status of the file.
+
+  Returns
+  -------
+  int
+    The allocated size (in bytes).
+  '''
+  if hasattr(info, 'st_blocks'):
+    return info.st_blocks * 512
+  # round up to the common 4 KiB block where st_blocks is not available
+  return -(-info.st_size // 4096) * 4096
+
+def fingerprint_file(filename : str, content_hash : bool = False) -> dict:
+  '''
+  Compute a fast fingerprint of a file, based on its path, size and last
+  modification time, optionally extended with the hash of its content.
+
+  Parameters
+  ----------
+  filename : str
+    The input file.
+
+  content_hash : bool, optional (default=False)
+    If True, the BLAKE2 digest of the file content is added to the
+    fingerprint. This is slower, since the whole file must be read, but it
+    is robust against changes which preserve size and modification time.
+
+  Returns
+  -------
+  dict
+    The fingerprint of the file.
+  '''
+  info = os.stat(filename)
+  fingerprint = {
+    'path': os.path.abspath(filename),
+    'size': info.st_size,
+    'mtime': info.st_mtime_ns,
+  }
+
+  if content_hash:
+    digest = hashlib.blake2b()
+    with open(filename, 'rb') as fp:
+      for chunk in iter(lambda: fp.read(1 << 20), b''):
+        digest.update(chunk)
+    fingerprint['hash'] = digest.hexdigest()
+
+  return fingerprint
+
+def fingerprint_array(x : np.ndarray) -> str:
+  '''
+  Compute the fingerprint of an array by hashing its content.
+
+  Parameters
+  ----------
+  x : np.ndarray
+    The input data.
+
+  Returns
+  -------
+  str
+    The BLAKE2 digest of the array dtype, shape and content.
+  '''
+  x = np.ascontiguousarray(x)
+  digest = hashlib.blake2b()
+  digest.update(f'{x.dtype.str}{x.shape}'.encode())
+  digest.update(x.data)
+  return digest.hexdigest()
+
+class ResultCache:
+  '''
+  A persistent cache of computed statistics stored on disk.
+  Each entry is a JSON file named after the content-addressed key of the
+  request. When the space allocated by the entries or their number
+  exceeds the given limits the least recently used entries are evicted.
+  The directory is scanned only once per instance, at the first write;
+  the following writes update the in-memory index of the entries.
+
+  Parameters
+  ----------
+  cache_dir : str, optional (default=None)
+    The directory in which the entries are stored. If None, the
+    DEFAULT_CACHE_DIR is used.
+
+  max_size : int, optional (default=DEFAULT_CACHE_SIZE)
+    The maximum space (in bytes) allocated on disk by the cache.
+
+  max_entries : int, optional (default=DEFAULT_CACHE_ENTRIES)
+    The maximum number of entries of the cache.
+  '''
+  def __init__(self, cache_dir : str = None, max_size : int = DEFAULT_CACHE_SIZE,
+               max_entries : int = DEFAULT_CACHE_ENTRIES):
+    self._cache_dir = cache_dir if cache_dir is not None else DEFAULT_CACHE_DIR
+
+    if not isinstance(max_size, int) or max_size <= 0:
+      raise ValueError(f'max_size must be a positive integer')
+    self._max_size = max_size
+
+    if not isinstance(max_entries, int) or max_entries <= 0:
+      raise ValueError(f'max_entries must be a positive integer')
+    self._max_entries = max_entries
+
+    # index of the entries (filename -> [last access, allocated size]),
+    # loaded at the first write
+    self._index = None
+    self._total = 0
+
+  @staticmethod
+  def make_key(**parts) -> str:
+    '''
+    Build the key of a cache entry from the description of the request.
+    The package version and the CACHE_VERSION are hashed together with the
+    request, so that entries computed by a different code are never served.
+
+    Parameters
+    ----------
+    **parts : dict
+      JSON-serializable description of the request, e.g. the fingerprint
+      of the data and the list of requested statistics.
+
+    Returns
+    -------
+    str
+      The SHA-256 digest of the request.
+    '''
+    request = json.dumps(
+      {
+        'version': [__version__, CACHE_VERSION],
+        'request': parts,
+      },
+      sort_keys=True,
+      default=str,
+    )
+    return hashlib.sha256(request.encode()).hexdigest()
+
+  def _path(self, key : str) -> str:
+    '''
+    Get the filename of a cache entry.
+    '''
+    return os.path.join(self._cache_dir, f'{key}.json')
+
+  def get(self, key : str):
+    '''
+    Retrieve a value from the cache.
+
+    Parameters
+    ----------
+    key : str
+      The key of the entry (see make_key).
+
+    Returns
+    -------
+    object or None
+      The cached value, or None if the entry is missing or unreadable.
+    '''
+    filename = self._path(key)
+    try:
+      with open(filename, 'r') as fp:
+        value = json.load(fp)
+    except (OSError, ValueError):
+      return None
+    # mark the entry as recently used, if the cache is writable
+    try:
+      os.utime(filename)
+    except OSError:
+      pass
+    if self._index is not None and f'{key}.json' in self._index:
+      self._index[f'{key}.json'][0] = time.time_ns()
+    return value
+
+  def put(self, key : str, value) -> None:
+    '''
+    Store a value in the cache, evicting the least recently used entries
+    if the cache exceeds its maximum size or number of entries.
+    The cache is a best-effort optimization, thus I/O errors and values
+    which cannot be serialized are ignored.
+
+    Parameters
+    ----------
+    key : str
+      The key of the entry (see make_key).
+
+    value : object
+      The JSON-serializable value to store.
+    '''
+    tmp = None
+    try:
+      os.makedirs(self._cache_dir, exist_ok=True)
+      # write to a temporary file and move it in place, so that
+      # concurrent readers never see a partial entry
+      fd, tmp = tempfile.mkstemp(dir=self._cache_dir, suffix='.tmp')
+      with os.fdopen(fd, 'w') as fp:
+        json.dump(value, fp)
+      os.replace(tmp, self._path(key))
+      tmp = None
+
+      # the first write loads the index, which includes the new entry
+      if self._index is None:
+        self._load_index()
+      else:
+        info = os.stat(self._path(key))
+        self._add(f'{key}.json', info.st_mtime_ns, _disk_usage(info))
+
+      if len(self._index) > self._max_entries or self._total > self._max_size:
+        self._evict()
+    except (OSError, TypeError, ValueError):
+      pass
+    finally:
+      # remove the temporary file of a failed write
+      if tmp is not None:
+        try:
+          os.remove(tmp)
+        except OSError:
+          pass
+
+  def _add(self, f : str, mtime : int, size : int) -> None:
+    '''
+    Add (or replace) an entry of the index.
+    '''
+    if f in self._index:
+      self._total -= self._index[f][1]
+    self._index[f] = [mtime, size]
+    self._total += size
+
+  def _load_index(self) -> None:
+    '''
+    Scan the cache directory to build the index of the entries.
+    '''
+    self._index = {}
+    self._total = 0
+    with os.scandir(self._cache_dir) as it:
+      for entry in it:
+        if not entry.name.endswith('.json'):
+          continue
+        try:
+          info = entry.stat()
+        except FileNotFoundError:
+          continue
+        self._add(entry.name, info.st_mtime_ns, _disk_usage(info))
+
+  def _evict(self) -> None:
+    '''
+    Remove the least recently used entries until the cache fits a
+    fraction of its limits, so that the eviction is not repeated at
+    every write.
+    '''
+    max_entries = int(self._max_entries * _LOW_WATER)
+    max_size = int(self._max_size * _LOW_WATER)
+    # the oldest entries are removed first
+    for f in sorted(self._index, key=lambda f: self._index[f][0]):
+      if len(self._index) <= max_entries and self._total <= max_size:
+        break
+      try:
+        os.remove(os.path.join(self._cache_dir, f))
+      except FileNotFoundError:
+        pass
+      self._total -= self._index.pop(f)[1]
+
+  def clear(self) -> None:
+    '''
+    Remove all the entries of the cache.
+    '''
+    self._index = None
+    self._total = 0
+    if not os.path.isdir(self._cache_dir):
+      return
+    for f in os.listdir(self._cache_dir):
+      if f.endswith('.json'):
+        try:
+          os.remove(os.path.join(self._cache_dir, f))
+        except FileNotFoundError:
+          pass
+
+  def __repr__(self):
+    return f"ResultCache(cache_dir={self._cache_dir}, max_size={self._max_size}, max_entries={self._max_entries})"
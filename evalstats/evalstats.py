@@ -2,8 +2,14 @@
 # -*- coding: utf-8 -*-
 
 import asyncio
+import threading
 import numpy as np
 from concurrent.futures import ThreadPoolExecutor
+from .cache import fingerprint_array
+from .accumulator import Accumulator
+from .accumulator import tree_reduce
+from .sketch import Histogram
+from .sketch import Summary
 
 __author__ = ['Nico Curti']
 __email__ = ['nico.curti2@unibo.it']
@@ -22,8 +28,13 @@ class EvalStats:
 
   num_workers : int, optional (default=4)
     The number of worker threads to use for parallel computation. Default is 4.
+
+  cache : ResultCache, optional (default=None)
+    The on-disk cache in which the statistics are stored, keyed by the
+    hash of the data content. If None, the statistics are memoized only
+    in the current instance.
   '''
-  def __init__(self, data : list, num_workers : int = 4):
+  def __init__(self, data : list, num_workers : int = 4, cache=None):
     # Validate input data
     self._data = np.asarray(data)
     
@@ -35,6 +46,10 @@ class EvalStats:
       raise ValueError(f'num_workers must be a positive integer')
     self._num_workers = num_workers
 
+    # set the persistent cache
+    self._cache = cache
+    self._fingerprint = None
+
   def __getattr__(self, name):
     '''
     Dynamically retrieve statistics methods based on the attribute name.
@@ -62,9 +77,47 @@ class EvalStats:
     # check if the method exists in the class
     if name not in self.__dict__:
       # call the method to compute the statistic
-      self.__dict__[name] = eval(f'self.compute_{name}()')
+      self.__dict__[name] = self._cached(name, eval(f'self.compute_{name}'))
     # return the value of the attribute
     return self.__dict__[name]
+
+  def _cached(self, name : str, func):
+    '''
+    Retrieve a statistic from the persistent cache, computing and storing
+    it if it is missing.
+
+    Parameters
+    ----------
+    name : str
+      The name of the statistic.
+
+    func : callable
+      The method which computes the statistic.
+
+    Returns
+    -------
+    object
+      The value of the statistic.
+    '''
+    if self._cache is None:
+      return func()
+    # the data are hashed only once
+    if self._fingerprint is None:
+      self._fingerprint = fingerprint_array(self._data)
+    key = self._cache.make_key(data=self._fingerprint, statistic=name)
+    value = self._cache.get(key)
+    if value is None:
+      value = func()
+      # convert NumPy scalars to builtin types
+      if isinstance(value, dict):
+        value = {
+          k: v.item() if isinstance(v, np.generic) else v
+          for k, v in value.items()
+        }
+      elif isinstance(value, np.generic):
+        value = value.item()
+      self._cache.put(key, value)
+    return value
   
   def update_data(self, new_data : list):
     '''
@@ -77,6 +130,7 @@ class EvalStats:
     '''
     # Convert new_data to a numpy array and flatten it
     self._data = np.asarray(new_data).flatten()
+    self._fingerprint = None
     # clear the cached statistics
     self.__dict__ = {
       k: v 
@@ -162,115 +216,230 @@ class EvalStats:
     '''
     return np.var(self._data)
   
-  def compute_all(self) -> dict:
+  def _split(self) -> list:
     '''
-    Compute all statistics and return them as a dictionary.
+    Split the data into blocks for parallel processing, one for each
+    worker thread.
 
     Returns
     -------
-    dict
-      A dictionary containing the mean, standard deviation, minimum,
-      maximum, total sum, and variance of the data.
+    list
+      The list of blocks (views) of the data.
     '''
+    n = len(self._data)
+    # If the number of threads is greater than the data length, use the data length
+    num_threads = max(min(self._num_workers, n), 1)
+    # Calculate the block size and create blocks
+    block_size = max((n + num_threads - 1) // num_threads, 1)
+    # Create blocks of data
+    return [
+      self._data[i:i + block_size] 
+      for i in range(0, n, block_size)
+    ]
 
-    def _block(x_block : np.ndarray) -> tuple:
-      '''
-      Compute statistics for a block of data.
+  def _map_blocks(self, func, blocks : list) -> list:
+    '''
+    Apply a function to each block of data in parallel using a thread pool,
+    with one thread for each block.
 
-      Parameters
-      ----------
-      x_block : np.ndarray
-        A block of data to compute statistics on.
-      Returns
-      -------
-      tuple
-        A tuple containing the mean, sum of squares, minimum, and maximum
-        of the block.
-      '''
-      mu = np.sum(x_block)
-      mu2 = np.sum(x_block ** 2)
-      m = np.min(x_block)
-      M = np.max(x_block)
-      return mu, mu2, m, M
-    
-    async def _async_parallel(x : np.ndarray, num_threads : int=4) -> tuple:
+    Parameters
+    ----------
+    func : callable
+      The function which reduces a block to its partial result.
+
+    blocks : list
+      The list of blocks of data (see _split).
+
+    Returns
+    -------
+    list
+      The list of partial results, one for each block of data.
+    '''
+
+    async def _async_parallel(blocks : list) -> list:
       '''
-      Asynchronously compute statistics in parallel using a thread pool.
+      Asynchronously reduce the blocks in parallel using a thread pool.
       
       Parameters
       ----------
-      x : np.ndarray
-        The input data to compute statistics on.
-      num_threads : int, optional (default=4)
-        The number of threads to use for parallel computation.
+      blocks : list
+        The list of blocks of data.
       
       Returns
       -------
-      tuple
-        A tuple containing the mean, standard deviation, minimum, maximum,
-        total sum, and variance of the input data.
+      list
+        The list of partial results, one for each block of data.
       '''
-      # Split the data into blocks for parallel processing
-      n = len(x)
-      # If the number of threads is greater than the data length, use the data length
-      if num_threads > n:
-        num_threads = n
-      # Calculate the block size and create blocks
-      block_size = (n + num_threads - 1) // num_threads
-      # Create blocks of data
-      blocks = [
-        x[i:i + block_size] 
-        for i in range(0, n, block_size)
-      ]
-
       # Define the event loop and executor for parallel execution
       loop = asyncio.get_running_loop()
       # Use ThreadPoolExecutor to run the blocking function in parallel
-      with ThreadPoolExecutor(max_workers=num_threads) as executor:
+      with ThreadPoolExecutor(max_workers=max(len(blocks), 1)) as executor:
         # Create a list of async tasks for each block
         tasks = []
         for block in blocks:
-          # Submit eval_block to executor, wrapped in async future
-          task = loop.run_in_executor(executor, _block, block)
+          # Submit the block reduction to executor, wrapped in async future
+          task = loop.run_in_executor(executor, func, block)
           tasks.append(task)
         # Gather results from all tasks
-        results = await asyncio.gather(*tasks)
-      
-      # Combine results from all blocks
-      total_mu = sum(r[0] for r in results)
-      total_mu2 = sum(r[1] for r in results)
-      global_min = min(r[2] for r in results)
-      global_max = max(r[3] for r in results)
-      # Calculate the mean and variance
-      mu = total_mu / n
-      var = (total_mu2 / n - mu * mu)
-      # Return the computed statistics
-      return mu, var ** 0.5, global_min, global_max, total_mu, var
-    
-    # Run the async function to compute statistics
-    if not asyncio.get_event_loop().is_running():
-      # If no event loop is running, create a new one
-      asyncio.set_event_loop(asyncio.new_event_loop())
-
-    # Call the async function to compute statistics
-    stats = asyncio.run(
-      _async_parallel(
-        x=self._data, 
-        num_threads=self._num_workers
-      )
-    )
-
-    # Return the statistics as a dictionary
-    return {
-      'mean': stats[0],
-      'std': stats[1],
-      'min': stats[2],
-      'max': stats[3],
-      'count': len(self._data),
-      'sum': stats[4],
-      'variance': stats[5],
-    }
+        return await asyncio.gather(*tasks)
+
+    # Call the async function to reduce the blocks
+    return asyncio.run(_async_parallel(blocks=blocks))
+
+  def accumulate(self) -> Accumulator:
+    '''
+    Compute the mergeable partial statistics of the data.
+    The data are split into blocks, reduced in parallel by the thread pool
+    and the per-block partials merged together.
+
+    Returns
+    -------
+    Accumulator
+      The partial statistics of the data, which could be merged with the
+      ones of other sets of data or serialized.
+    '''
+    partials = self._map_blocks(Accumulator.from_array, self._split())
+    # Combine results from all blocks
+    return tree_reduce(partials)
+
+  def scan(self, bins : int = None, range : tuple = None, precision : int = None) -> dict:
+    '''
+    Compute all statistics, the histogram and the approximate distinct
+    count of the data in a single parallel scan.
+    Each worker reduces its block to a Summary, and the per-block
+    summaries are merged as in compute_all. If the range of the histogram
+    is not given, the workers share the minimum and maximum of their
+    blocks and wait for each other before binning, so that the bins are
+    derived from the global range found in the same pass.
+
+    Parameters
+    ----------
+    bins : int, optional (default=None)
+      The number of bins of the histogram. If None, the histogram is not
+      computed.
+
+    range : tuple, optional (default=None)
+      The lower and upper edges of the bins. If None, the minimum and
+      maximum of the data are used.
+
+    precision : int, optional (default=None)
+      The precision of the distinct-count sketch (see HyperLogLog). If
+      None, the distinct count is not computed.
+
+    Returns
+    -------
+    dict
+      A dictionary containing the statistics of compute_all, plus the
+      histogram and/or the distinct count, if required.
+
+    Raises
+    ------
+    ValueError
+      If the range of the histogram is derived from data containing NaN
+      or infinite values.
+    '''
+    blocks = self._split()
+    if not blocks:
+      return Summary(bins, range or (0., 1.), precision).to_dict()
+
+    # shared state used to derive the range of the bins
+    derive = bins is not None and range is None
+    lock = threading.Lock()
+    bounds = [np.inf, -np.inf]
+    barrier = threading.Barrier(len(blocks))
+
+    def _block(x_block : np.ndarray) -> Summary:
+      '''
+      Compute the summary of a block of data.
+
+      Parameters
+      ----------
+      x_block : np.ndarray
+        A block of data to compute statistics on.
+
+      Returns
+      -------
+      Summary
+        The partial summary of the block.
+      '''
+      summary = Summary(precision=precision)
+      try:
+        summary.stats = Accumulator.from_array(x_block)
+      except BaseException:
+        # release the other workers waiting for the range
+        barrier.abort()
+        raise
+
+      if bins is not None:
+        if derive:
+          with lock:
+            # a NaN extremum poisons the range whatever the block order
+            if np.isnan(summary.stats.min) or np.isnan(summary.stats.max):
+              bounds[0], bounds[1] = np.nan, np.nan
+            elif not np.isnan(bounds[0]):
+              bounds[0] = np.fmin(bounds[0], summary.stats.min)
+              bounds[1] = np.fmax(bounds[1], summary.stats.max)
+          barrier.wait()
+          if not np.isfinite(bounds[0]) or not np.isfinite(bounds[1]):
+            raise ValueError(f'autodetected range of [{bounds[0]}, {bounds[1]}] is not finite')
+        summary.histogram = Histogram(bins, tuple(bounds) if derive else range)
+        summary.histogram.update(x_block)
+
+      if summary.distinct is not None:
+        summary.distinct.update(x_block)
+      return summary
+
+    # Combine results from all blocks
+    return tree_reduce(self._map_blocks(_block, blocks)).to_dict()
+
+  def compute_all(self) -> dict:
+    '''
+    Compute all statistics and return them as a dictionary.
+
+    Returns
+    -------
+    dict
+      A dictionary containing the mean, standard deviation, minimum,
+      maximum, count, total sum, and variance of the data.
+    '''
+    return self.accumulate().to_dict()
   
+  def compute_histogram(self, bins : int = 10, range : tuple = None) -> dict:
+    '''
+    Compute the histogram of the data with equally spaced bins.
+
+    Parameters
+    ----------
+    bins : int, optional (default=10)
+      The number of bins.
+
+    range : tuple, optional (default=None)
+      The lower and upper edges of the bins. If None, the minimum and
+      maximum of the data are used.
+
+    Returns
+    -------
+    dict
+      A dictionary containing the edges and the counts of the bins.
+    '''
+    return self.scan(bins=bins, range=range)['histogram']
+
+  def compute_distinct(self, precision : int = 12) -> int:
+    '''
+    Compute the approximate number of distinct values of the data.
+
+    Parameters
+    ----------
+    precision : int, optional (default=12)
+      The precision of the HyperLogLog sketch.
+
+    Returns
+    -------
+    int
+      The approximate number of distinct values.
+    '''
+    return self.scan(precision=precision)['distinct']
+
   def __repr__(self):
     return f"EvalStats(data={self._data}, num_workers={self._num_workers})"
   
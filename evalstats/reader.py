@@ -0,0 +1,496 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+import bz2
+import glob
+import gzip
+import lzma
+import zlib
+import queue
+import asyncio
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+from .accumulator import Accumulator
+from .accumulator import tree_reduce
+
+__author__ = ['Nico Curti']
+__email__ = ['nico.curti2@unibo.it']
+
+__all__ = [
+  'SUPPORTED_EXTENSIONS',
+  'expand_inputs',
+  'open_input',
+  'reduce_files',
+  'map_reduce',
+]
+
+# file extensions accepted as input data
+SUPPORTED_EXTENSIONS = ('.csv', '.csv.gz', '.csv.bz2', '.csv.xz')
+
+# stdlib decoders of the compressed inputs
+CODECS = {
+  '.gz': gzip.open,
+  '.bz2': bz2.open,
+  '.xz': lzma.open,
+}
+
+# size (in bytes) of the chunks read from the input files
+CHUNK_SIZE = 1 << 20
+
+# maximum number of chunks buffered between two stages of the pipeline
+QUEUE_SIZE = 4
+
+# sentinel marking the end of a stream of chunks
+_EOF = None
+
+# errors raised by the codecs on corrupted or truncated inputs
+_DECODE_ERRORS = (EOFError, zlib.error, lzma.LZMAError, gzip.BadGzipFile)
+
+# value separators of the CSV content
+_SEPARATORS = (b',', b'\n', b'\r', b' ', b'\t')
+
+def expand_inputs(inputs : list) -> list:
+  '''
+  Expand a list of input paths into the list of files to process.
+  Each entry could be a plain filename, a glob pattern (e.g. 'data/*.csv')
+  or a directory; in the last two cases only the supported files matched
+  by the pattern or contained in the directory are used.
+
+  Parameters
+  ----------
+  inputs : list
+    The list of filenames, glob patterns and/or directories.
+
+  Returns
+  -------
+  list
+    The list of unique filenames to process, in order of appearance.
+
+  Raises
+  -------
+  FileNotFoundError
+    If an entry does not match any existing supported file.
+
+  ValueError
+    If a plain filename has an unsupported extension.
+  '''
+  filenames = []
+  # real paths of the listed files, so that the same file reached
+  # through different spellings is processed only once
+  seen = set()
+
+  for entry in inputs:
+    # a directory is expanded into its supported files
+    if os.path.isdir(entry):
+      matches = sorted(
+        os.path.join(entry, f)
+        for f in os.listdir(entry)
+        if f.endswith(SUPPORTED_EXTENSIONS) and os.path.isfile(os.path.join(entry, f))
+      )
+    # a glob pattern is expanded into the matching supported files
+    elif any(c in entry for c in '*?['):
+      matches = sorted(
+        f
+        for f in glob.glob(entry, recursive=True)
+        if os.path.isfile(f) and f.endswith(SUPPORTED_EXTENSIONS)
+      )
+    # otherwise the entry is a plain filename
+    else:
+      matches = [entry]
+
+    if not matches or not all(os.path.isfile(f) for f in matches):
+      raise FileNotFoundError(f'Input file {entry} not found')
+
+    for f in matches:
+      if not f.endswith(SUPPORTED_EXTENSIONS):
+        raise ValueError(
+          f'Input file {f} must be one of {", ".join(SUPPORTED_EXTENSIONS)}'
+        )
+      # skip files already listed by a previous entry,
+      # keeping the spelling of the first one
+      path = os.path.realpath(f)
+      if path not in seen:
+        seen.add(path)
+        filenames.append(f)
+
+  return filenames
+
+def open_input(filename : str):
+  '''
+  Open an input file in binary mode, decoding it on the fly if it is
+  compressed with one of the supported codecs (gzip, bz2 or xz).
+
+  Parameters
+  ----------
+  filename : str
+    The input file.
+
+  Returns
+  -------
+  file object
+    The binary stream of the (decompressed) file content.
+  '''
+  _, ext = os.path.splitext(filename)
+  return CODECS.get(ext, open)(filename, 'rb')
+
+def _parse(buffer : bytes) -> np.ndarray:
+  '''
+  Parse a buffer of CSV text into a one-dimensional array.
+
+  Parameters
+  ----------
+  buffer : bytes
+    The CSV content. Values could be separated by commas and/or newlines.
+
+  Returns
+  -------
+  np.ndarray
+    The flattened array of values stored in the buffer.
+  '''
+  # commas and newlines are both value separators
+  return np.array(buffer.replace(b',', b' ').split(), dtype=np.float64)
+
+def _put(q : queue.Queue, item, stop : threading.Event) -> bool:
+  '''
+  Put an item in a bounded queue, giving up if the pipeline is stopped.
+
+  Parameters
+  ----------
+  q : queue.Queue
+    The destination queue.
+
+  item : object
+    The item to enqueue.
+
+  stop : threading.Event
+    The event signaling that the consumer does not need more items.
+
+  Returns
+  -------
+  bool
+    True if the item was enqueued, False if the pipeline was stopped.
+  '''
+  while not stop.is_set():
+    try:
+      q.put(item, timeout=0.1)
+      return True
+    except queue.Full:
+      pass
+  return False
+
+def _get(q : queue.Queue, stop : threading.Event):
+  '''
+  Get an item from a queue, giving up if the pipeline is stopped.
+
+  Parameters
+  ----------
+  q : queue.Queue
+    The source queue.
+
+  stop : threading.Event
+    The event signaling that the consumer does not need more items.
+
+  Returns
+  -------
+  object
+    The dequeued item, or _EOF if the pipeline was stopped.
+  '''
+  while not stop.is_set():
+    try:
+      return q.get(timeout=0.1)
+    except queue.Empty:
+      pass
+  return _EOF
+
+def _decompress(filename : str, chunk_size : int, out_queue : queue.Queue, stop : threading.Event):
+  '''
+  First stage of the pipeline: read and decode the file chunk by chunk.
+  Decoding errors are forwarded as ValueError.
+
+  Parameters
+  ----------
+  filename : str
+    The input file.
+
+  chunk_size : int
+    The number of bytes read at each step.
+
+  out_queue : queue.Queue
+    The queue of the raw chunks.
+
+  stop : threading.Event
+    The event signaling that the pipeline must be stopped.
+  '''
+  compressed = os.path.splitext(filename)[1] in CODECS
+  opened = False
+  try:
+    with open_input(filename) as fp:
+      opened = True
+      while True:
+        chunk = fp.read(chunk_size)
+        if not chunk or not _put(out_queue, chunk, stop):
+          break
+  except Exception as err:
+    # some codecs (e.g. bz2) report a corrupted content as a plain OSError
+    if isinstance(err, _DECODE_ERRORS) or (opened and compressed and isinstance(err, OSError)):
+      error = ValueError(f'Cannot decode {filename}: {err}')
+      error.__cause__ = err
+      err = error
+    _put(out_queue, err, stop)
+  _put(out_queue, _EOF, stop)
+
+def _tokenize(in_queue : queue.Queue, out_queue : queue.Queue, stop : threading.Event):
+  '''
+  Second stage of the pipeline: parse the raw chunks into NumPy buffers.
+  Each chunk is cut at its last separator (comma or whitespace) and the
+  trailing partial value is carried over to the next chunk, so that the
+  carried bytes never exceed a single value, even for single-row files.
+
+  Parameters
+  ----------
+  in_queue : queue.Queue
+    The queue of the raw chunks.
+
+  out_queue : queue.Queue
+    The queue of the parsed arrays.
+
+  stop : threading.Event
+    The event signaling that the pipeline must be stopped.
+  '''
+  rest = b''
+  try:
+    while True:
+      chunk = _get(in_queue, stop)
+      if chunk is _EOF:
+        break
+      # forward the errors of the previous stage
+      if isinstance(chunk, Exception):
+        _put(out_queue, chunk, stop)
+        continue
+      chunk = rest + chunk
+      cut = max(chunk.rfind(sep) for sep in _SEPARATORS) + 1
+      rest = chunk[cut:]
+      if cut and not _put(out_queue, _parse(chunk[:cut]), stop):
+        break
+    if rest:
+      _put(out_queue, _parse(rest), stop)
+  except Exception as err:
+    _put(out_queue, err, stop)
+  _put(out_queue, _EOF, stop)
+
+def _reduce_file(filename : str, chunk_size : int = CHUNK_SIZE, queue_size : int = QUEUE_SIZE,
+                 factory=Accumulator) -> Accumulator:
+  '''
+  Reduce a (possibly compressed) file to its partial statistics.
+  The file is processed by a pipeline of three stages connected by bounded
+  queues: a thread decodes the file, a second one parses the chunks into
+  NumPy buffers and the calling worker reduces them, so that decompression,
+  parsing and reduction run concurrently using a bounded amount of memory.
+
+  Parameters
+  ----------
+  filename : str
+    The input file.
+
+  chunk_size : int, optional (default=CHUNK_SIZE)
+    The number of bytes read at each step.
+
+  queue_size : int, optional (default=QUEUE_SIZE)
+    The maximum number of chunks buffered between two stages.
+
+  factory : callable, optional (default=Accumulator)
+    The constructor of the empty partial, e.g. a Summary which updates
+    also a histogram and a distinct-count sketch in the same scan.
+
+  Returns
+  -------
+  Accumulator
+    The partial statistics of the file.
+  '''
+  raw = queue.Queue(maxsize=queue_size)
+  arrays = queue.Queue(maxsize=queue_size)
+  stop = threading.Event()
+
+  stages = [
+    threading.Thread(target=_decompress, args=(filename, chunk_size, raw, stop), daemon=True),
+    threading.Thread(target=_tokenize, args=(raw, arrays, stop), daemon=True),
+  ]
+  for stage in stages:
+    stage.start()
+
+  total = factory()
+  try:
+    while True:
+      x = arrays.get()
+      if x is _EOF:
+        break
+      if isinstance(x, Exception):
+        raise x
+      total.update(x)
+  finally:
+    # release the producers still waiting on a full queue
+    stop.set()
+    for stage in stages:
+      stage.join()
+
+  return total
+
+def reduce_files(filenames : list, num_workers : int = 4,
+                 chunk_size : int = CHUNK_SIZE, queue_size : int = QUEUE_SIZE,
+                 factory=Accumulator) -> tuple:
+  '''
+  Compute the statistics of a set of files concurrently.
+  Each file is read, parsed and reduced to its partial statistics by a
+  worker of the thread pool, so that the I/O of a file overlaps with the
+  computation on the others. The partials are finally merged into the
+  global statistics.
+  Compressed files (.csv.gz, .csv.bz2, .csv.xz) are decoded on the fly.
+
+  Parameters
+  ----------
+  filenames : list
+    The list of input files (see expand_inputs).
+
+  num_workers : int, optional (default=4)
+    The number of worker threads to use for parallel computation.
+
+  chunk_size : int, optional (default=CHUNK_SIZE)
+    The number of bytes read at each step from each file.
+
+  queue_size : int, optional (default=QUEUE_SIZE)
+    The maximum number of chunks buffered between two stages of the
+    pipeline of each file.
+
+  factory : callable, optional (default=Accumulator)
+    The constructor of the empty partial of each file (see Summary).
+
+  Returns
+  -------
+  tuple
+    A tuple containing the Accumulator of the global statistics and a
+    dictionary mapping each filename to its own Accumulator.
+  Raises
+  -------
+  OSError
+    If a file cannot be read.
+
+  ValueError
+    If the content of a file cannot be decoded or parsed.
+  '''
+  if not isinstance(num_workers, int) or num_workers <= 0:
+    raise ValueError(f'num_workers must be a positive integer')
+
+  async def _async_parallel(filenames : list, num_threads : int) -> list:
+    '''
+    Asynchronously reduce the files in parallel using a thread pool.
+
+    Parameters
+    ----------
+    filenames : list
+      The list of input files.
+
+    num_threads : int
+      The number of threads to use for parallel computation.
+
+    Returns
+    -------
+    list
+      The list of partial statistics, one for each file.
+    '''
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+      tasks = [
+        loop.run_in_executor(executor, _reduce_file, f, chunk_size, queue_size, factory)
+        for f in filenames
+      ]
+      return await asyncio.gather(*tasks)
+
+  partials = asyncio.run(
+    _async_parallel(
+      filenames=filenames,
+      num_threads=num_workers,
+    )
+  )
+
+  # merge the per-file partials into the global one
+  return tree_reduce(partials), dict(zip(filenames, partials))
+
+def _reduce_file_bytes(filename : str, chunk_size : int = CHUNK_SIZE, queue_size : int = QUEUE_SIZE) -> bytes:
+  '''
+  Reduce a file to the binary encoding of its partial statistics.
+  This is the task run by the worker processes of map_reduce.
+
+  Parameters
+  ----------
+  filename : str
+    The input file.
+
+  chunk_size : int, optional (default=CHUNK_SIZE)
+    The number of bytes read at each step.
+
+  queue_size : int, optional (default=QUEUE_SIZE)
+    The maximum number of chunks buffered between two stages.
+
+  Returns
+  -------
+  bytes
+    The encoded partial statistics of the file.
+  '''
+  return _reduce_file(filename, chunk_size, queue_size).to_bytes()
+
+def map_reduce(filenames : list, num_processes : int = 2,
+               chunk_size : int = CHUNK_SIZE, queue_size : int = QUEUE_SIZE) -> tuple:
+  '''
+  Compute the statistics of a set of files using multiple processes.
+  Each worker process reduces a file to its partial statistics, which are
+  sent back to the parent process in their binary encoding and merged
+  together. This is a local stand-in for a distributed map-reduce, in
+  which the partials are produced by different hosts.
+
+  Parameters
+  ----------
+  filenames : list
+    The list of input files (see expand_inputs).
+
+  num_processes : int, optional (default=2)
+    The number of worker processes.
+
+  chunk_size : int, optional (default=CHUNK_SIZE)
+    The number of bytes read at each step from each file.
+
+  queue_size : int, optional (default=QUEUE_SIZE)
+    The maximum number of chunks buffered between two stages of the
+    pipeline of each file.
+
+  Returns
+  -------
+  tuple
+    A tuple containing the Accumulator of the global statistics and a
+    dictionary mapping each filename to its own Accumulator.
+  Raises
+  -------
+  OSError
+    If a file cannot be read.
+
+  ValueError
+    If the content of a file cannot be decoded or parsed.
+  '''
+  if not isinstance(num_processes, int) or num_processes <= 0:
+    raise ValueError(f'num_processes must be a positive integer')
+
+  with ProcessPoolExecutor(max_workers=num_processes) as executor:
+    buffers = list(executor.map(
+      _reduce_file_bytes,
+      filenames,
+      [chunk_size] * len(filenames),
+      [queue_size] * len(filenames),
+    ))
+
+  partials = [
+    Accumulator.from_bytes(buffer)
+    for buffer in buffers
+  ]
+  return tree_reduce(partials), dict(zip(filenames, partials))
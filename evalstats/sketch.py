@@ -0,0 +1,341 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from .accumulator import Accumulator
+
+__author__ = ['Nico Curti']
+__email__ = ['nico.curti2@unibo.it']
+
+__all__ = [
+  'Histogram',
+  'HyperLogLog',
+  'Summary',
+]
+
+class Histogram:
+  '''
+  Mergeable histogram with fixed, equally spaced bins.
+  Values outside the range are ignored, as in np.histogram.
+
+  Parameters
+  ----------
+  bins : int, optional (default=10)
+    The number of bins.
+
+  range : tuple, optional (default=(0., 1.))
+    The lower and upper edges of the bins.
+  '''
+  def __init__(self, bins : int = 10, range : tuple = (0., 1.)):
+    if not isinstance(bins, int) or bins <= 0:
+      raise ValueError(f'bins must be a positive integer')
+    lo, hi = map(float, range)
+    if not np.isfinite(lo) or not np.isfinite(hi) or lo > hi:
+      raise ValueError(f'range must be a finite interval, got ({lo}, {hi})')
+    # an empty range is expanded as in np.histogram
+    if lo == hi:
+      lo, hi = lo - .5, hi + .5
+    self.bins = bins
+    self.range = (lo, hi)
+    self.counts = np.zeros(bins, dtype=np.int64)
+
+  @property
+  def edges(self) -> np.ndarray:
+    '''
+    The edges of the bins.
+    '''
+    return np.linspace(*self.range, self.bins + 1)
+
+  def update(self, x : np.ndarray) -> 'Histogram':
+    '''
+    Update the histogram with new values.
+
+    Parameters
+    ----------
+    x : np.ndarray
+      The new data.
+
+    Returns
+    -------
+    Histogram
+      The updated histogram (self).
+    '''
+    counts, _ = np.histogram(x, bins=self.bins, range=self.range)
+    self.counts += counts
+    return self
+
+  def merge(self, other : 'Histogram') -> 'Histogram':
+    '''
+    Merge two histograms with the same bins.
+
+    Parameters
+    ----------
+    other : Histogram
+      The histogram to merge with.
+
+    Returns
+    -------
+    Histogram
+      The histogram of the union of the two sets of data.
+
+    Raises
+    -------
+    ValueError
+      If the two histograms have different bins.
+    '''
+    if self.bins != other.bins or self.range != other.range:
+      raise ValueError(f'Cannot merge histograms with different bins')
+    merged = self.__class__(self.bins, self.range)
+    merged.counts = self.counts + other.counts
+    return merged
+
+  def to_dict(self) -> dict:
+    '''
+    Convert the histogram into a dictionary.
+
+    Returns
+    -------
+    dict
+      A dictionary containing the edges and the counts of the bins.
+    '''
+    return {
+      'edges': self.edges.tolist(),
+      'counts': self.counts.tolist(),
+    }
+
+  def __repr__(self):
+    return f"Histogram(bins={self.bins}, range={self.range})"
+
+class HyperLogLog:
+  '''
+  Mergeable sketch of the approximate number of distinct values.
+  The values are hashed with the SplitMix64 finalizer applied to their
+  binary representation: the first `precision` bits of the hash select a
+  register, which keeps the maximum position of the leftmost 1-bit of the
+  remaining ones. The relative error of the estimate is about
+  1.04 / sqrt(2 ** precision).
+
+  Parameters
+  ----------
+  precision : int, optional (default=12)
+    The number of bits used to select the register, in the range [4, 18].
+  '''
+  def __init__(self, precision : int = 12):
+    if not isinstance(precision, int) or not 4 <= precision <= 18:
+      raise ValueError(f'precision must be an integer in the range [4, 18]')
+    self.precision = precision
+    self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+  @staticmethod
+  def _hash(x : np.ndarray) -> np.ndarray:
+    '''
+    Compute the 64-bit hash of the values.
+
+    Parameters
+    ----------
+    x : np.ndarray
+      The input data.
+
+    Returns
+    -------
+    np.ndarray
+      The array of hashes.
+    '''
+    # adding 0. maps -0. to 0., so that they share the same hash
+    h = (np.asarray(x, dtype=np.float64).ravel() + 0.).view(np.uint64)
+    with np.errstate(over='ignore'):
+      h = h + np.uint64(0x9E3779B97F4A7C15)
+      h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+      h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+  @staticmethod
+  def _bit_length(w : np.ndarray) -> np.ndarray:
+    '''
+    Compute the number of significant bits of each value.
+
+    Parameters
+    ----------
+    w : np.ndarray
+      The array of unsigned integers.
+
+    Returns
+    -------
+    np.ndarray
+      The number of bits needed to represent each value.
+    '''
+    n = np.zeros(w.shape, dtype=np.uint8)
+    # binary search of the highest 1-bit
+    for shift in (32, 16, 8, 4, 2, 1):
+      high = w >= np.uint64(1 << shift)
+      n[high] += shift
+      w = np.where(high, w >> np.uint64(shift), w)
+    return n + (w > 0)
+
+  def update(self, x : np.ndarray) -> 'HyperLogLog':
+    '''
+    Update the sketch with new values.
+
+    Parameters
+    ----------
+    x : np.ndarray
+      The new data.
+
+    Returns
+    -------
+    HyperLogLog
+      The updated sketch (self).
+    '''
+    h = self._hash(x)
+    p = np.uint64(self.precision)
+    idx = (h >> (np.uint64(64) - p)).astype(np.intp)
+    # position of the leftmost 1-bit of the remaining bits
+    rho = 64 - self._bit_length(h << p) + 1
+    rho = np.minimum(rho, 64 - self.precision + 1).astype(np.uint8)
+    np.maximum.at(self.registers, idx, rho)
+    return self
+
+  def merge(self, other : 'HyperLogLog') -> 'HyperLogLog':
+    '''
+    Merge two sketches with the same precision.
+
+    Parameters
+    ----------
+    other : HyperLogLog
+      The sketch to merge with.
+
+    Returns
+    -------
+    HyperLogLog
+      The sketch of the union of the two sets of data.
+
+    Raises
+    -------
+    ValueError
+      If the two sketches have different precision.
+    '''
+    if self.precision != other.precision:
+      raise ValueError(f'Cannot merge sketches with different precision')
+    merged = self.__class__(self.precision)
+    merged.registers = np.maximum(self.registers, other.registers)
+    return merged
+
+  def estimate(self) -> int:
+    '''
+    Estimate the number of distinct values.
+
+    Returns
+    -------
+    int
+      The approximate number of distinct values.
+    '''
+    m = len(self.registers)
+    alpha = 0.7213 / (1. + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.ldexp(1., -self.registers.astype(np.int32)))
+    # small range correction (linear counting)
+    zeros = np.count_nonzero(self.registers == 0)
+    if estimate <= 2.5 * m and zeros:
+      estimate = m * np.log(m / zeros)
+    return int(round(estimate))
+
+  def __repr__(self):
+    return f"HyperLogLog(precision={self.precision})"
+
+class Summary:
+  '''
+  Mergeable partial statistics, histogram and distinct-count sketch of a
+  set of data, updated together in a single scan.
+
+  Parameters
+  ----------
+  bins : int, optional (default=None)
+    The number of bins of the histogram. If None, the histogram is not
+    computed.
+
+  range : tuple, optional (default=None)
+    The lower and upper edges of the bins. It is required if bins is set.
+
+  precision : int, optional (default=None)
+    The precision of the distinct-count sketch. If None, the distinct
+    count is not computed.
+  '''
+  def __init__(self, bins : int = None, range : tuple = None, precision : int = None):
+    if bins is not None and range is None:
+      raise ValueError(f'The range of the histogram must be set')
+    self.stats = Accumulator()
+    self.histogram = Histogram(bins, range) if bins is not None else None
+    self.distinct = HyperLogLog(precision) if precision is not None else None
+
+  def update(self, x : np.ndarray) -> 'Summary':
+    '''
+    Update the summary with new values.
+
+    Parameters
+    ----------
+    x : np.ndarray
+      The new data.
+
+    Returns
+    -------
+    Summary
+      The updated summary (self).
+    '''
+    self.stats.update(x)
+    if self.histogram is not None:
+      self.histogram.update(x)
+    if self.distinct is not None:
+      self.distinct.update(x)
+    return self
+
+  def merge(self, other : 'Summary') -> 'Summary':
+    '''
+    Merge two summaries.
+
+    Parameters
+    ----------
+    other : Summary
+      The summary to merge with.
+
+    Returns
+    -------
+    Summary
+      The summary of the union of the two sets of data.
+
+    Raises
+    -------
+    TypeError
+      If other is not a Summary.
+
+    ValueError
+      If the two summaries do not track the same sketches.
+    '''
+    if not isinstance(other, Summary):
+      raise TypeError(f'Cannot merge {self.__class__.__name__} with {other.__class__.__name__}')
+    if (self.histogram is None) != (other.histogram is None) or \
+       (self.distinct is None) != (other.distinct is None):
+      raise ValueError(f'Cannot merge summaries with different sketches')
+    merged = self.__class__()
+    merged.stats = self.stats.merge(other.stats)
+    if self.histogram is not None:
+      merged.histogram = self.histogram.merge(other.histogram)
+    if self.distinct is not None:
+      merged.distinct = self.distinct.merge(other.distinct)
+    return merged
+
+  def to_dict(self) -> dict:
+    '''
+    Convert the summary into the dictionary of statistics.
+
+    Returns
+    -------
+    dict
+      A dictionary containing the statistics of the data (see
+      Accumulator.to_dict), the histogram and the distinct count, if
+      computed.
+    '''
+    results = self.stats.to_dict()
+    if self.histogram is not None:
+      results['histogram'] = self.histogram.to_dict()
+    if self.distinct is not None:
+      results['distinct'] = self.distinct.estimate()
+    return results
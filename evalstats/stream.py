@@ -0,0 +1,333 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+import numpy as np
+from time import monotonic
+from .accumulator import Accumulator
+from .reader import _parse
+from .reader import _SEPARATORS
+
+__author__ = ['Nico Curti']
+__email__ = ['nico.curti2@unibo.it']
+
+__all__ = [
+  'SlidingWindow',
+  'ExponentialDecay',
+  'stream',
+]
+
+# size (in bytes) of the chunks read from the stream
+CHUNK_SIZE = 1 << 16
+
+# maximum number of chunks buffered between the reader and the consumer
+QUEUE_SIZE = 4
+
+# sentinel marking the end of the input stream
+_EOF = object()
+
+class SlidingWindow:
+  '''
+  Statistics of the most recent values of a stream.
+  The values are stored in a ring buffer of fixed size, so that the memory
+  usage does not depend on the length of the stream.
+
+  Parameters
+  ----------
+  size : int
+    The number of most recent values on which statistics are computed.
+  '''
+  def __init__(self, size : int):
+    if not isinstance(size, int) or size <= 0:
+      raise ValueError(f'size must be a positive integer')
+    self._buffer = np.empty(size, dtype=np.float64)
+    self._pos = 0
+    self._filled = 0
+
+  def update(self, x : np.ndarray) -> 'SlidingWindow':
+    '''
+    Push new values in the window, dropping the oldest ones.
+
+    Parameters
+    ----------
+    x : np.ndarray
+      The new data.
+
+    Returns
+    -------
+    SlidingWindow
+      The updated window (self).
+    '''
+    x = np.asarray(x, dtype=np.float64).ravel()
+    size = len(self._buffer)
+    # only the last values could fit the window
+    x = x[-size:]
+    n = len(x)
+    # write the values wrapping around the end of the buffer
+    head = min(n, size - self._pos)
+    self._buffer[self._pos:self._pos + head] = x[:head]
+    self._buffer[:n - head] = x[head:]
+    self._pos = (self._pos + n) % size
+    self._filled = min(self._filled + n, size)
+    return self
+
+  def to_dict(self) -> dict:
+    '''
+    Compute the statistics of the values in the window.
+
+    Returns
+    -------
+    dict
+      A dictionary containing the mean, standard deviation, minimum,
+      maximum, count, total sum, and variance of the window.
+    '''
+    return Accumulator.from_array(self._buffer[:self._filled]).to_dict()
+
+class ExponentialDecay:
+  '''
+  Exponentially weighted statistics of a stream.
+  The weight of each value is multiplied by (1 - alpha) whenever a new
+  value is received, so that the statistics follow the recent history of
+  the stream using a constant amount of memory.
+
+  Parameters
+  ----------
+  alpha : float
+    The decay factor, in the range (0, 1]. Larger values forget the past
+    faster.
+  '''
+  def __init__(self, alpha : float):
+    if not 0. < alpha <= 1.:
+      raise ValueError(f'alpha must be in the range (0, 1]')
+    self._alpha = alpha
+    self._count = 0
+    self._weight = 0.
+    self._mean = 0.
+    self._m2 = 0.
+
+  def update(self, x : np.ndarray) -> 'ExponentialDecay':
+    '''
+    Update the weighted statistics with new values.
+
+    Parameters
+    ----------
+    x : np.ndarray
+      The new data, from the oldest to the most recent.
+
+    Returns
+    -------
+    ExponentialDecay
+      The updated statistics (self).
+    '''
+    x = np.asarray(x, dtype=np.float64).ravel()
+    n = len(x)
+    if n == 0:
+      return self
+    # weights of the new values, the most recent one weighting 1
+    w = (1. - self._alpha) ** np.arange(n - 1, -1, -1)
+    wb = np.sum(w)
+    mb = np.sum(w * x) / wb
+    m2b = np.sum(w * (x - mb) ** 2)
+    # decay the weight of the previous values
+    decay = (1. - self._alpha) ** n
+    wa = self._weight * decay
+    m2a = self._m2 * decay
+    # merge the two weighted partials
+    self._weight = wa + wb
+    delta = mb - self._mean
+    self._mean = self._mean + delta * wb / self._weight
+    self._m2 = m2a + m2b + delta * delta * wa * wb / self._weight
+    self._count += n
+    return self
+
+  def to_dict(self) -> dict:
+    '''
+    Compute the exponentially weighted statistics.
+
+    Returns
+    -------
+    dict
+      A dictionary containing the weighted mean, standard deviation and
+      variance, the total count of the values and their effective weight.
+    '''
+    var = self._m2 / self._weight if self._weight else 0.
+    return {
+      'mean': float(self._mean),
+      'std': float(var ** 0.5),
+      'variance': float(var),
+      'count': self._count,
+      'weight': float(self._weight),
+    }
+
+def _parse_valid(buffer : bytes) -> tuple:
+  '''
+  Parse a buffer of CSV text, skipping the tokens which are not numbers
+  (e.g. a header, a log line or a truncated write), so that a single
+  malformed record does not stop the monitoring of the stream.
+
+  Parameters
+  ----------
+  buffer : bytes
+    The CSV content. Values could be separated by commas and/or newlines.
+
+  Returns
+  -------
+  tuple
+    A tuple containing the array of the valid values and the number of
+    skipped tokens.
+  '''
+  try:
+    return _parse(buffer), 0
+  except ValueError:
+    pass
+  # slow path, taken only by the chunks with malformed tokens
+  values = []
+  invalid = 0
+  for token in buffer.replace(b',', b' ').split():
+    try:
+      values.append(float(token))
+    except ValueError:
+      invalid += 1
+  return np.array(values, dtype=np.float64), invalid
+
+def _read_chunks(fp, chunks : queue.Queue, chunk_size : int):
+  '''
+  Read a stream in chunks of bounded size into a bounded queue.
+  Each chunk is cut at its last separator (comma or whitespace) and the
+  trailing partial value is carried over to the next chunk, as in the file
+  pipeline, so that the memory usage is bounded even if the stream has no
+  newlines or the consumer is slower than the producer.
+
+  Parameters
+  ----------
+  fp : file object
+    The binary input stream.
+
+  chunks : queue.Queue
+    The queue of the chunks of complete values.
+
+  chunk_size : int
+    The maximum number of bytes read at each step.
+  '''
+  # read1 returns the bytes already available instead of
+  # waiting for the whole chunk
+  read = getattr(fp, 'read1', fp.read)
+  rest = b''
+  try:
+    while True:
+      chunk = read(chunk_size)
+      if not chunk:
+        break
+      chunk = rest + chunk
+      cut = max(chunk.rfind(sep) for sep in _SEPARATORS) + 1
+      rest = chunk[cut:]
+      if cut:
+        chunks.put(chunk[:cut])
+    if rest:
+      chunks.put(rest)
+  except Exception as err:
+    chunks.put(err)
+  finally:
+    chunks.put(_EOF)
+
+def stream(fp, every : int = 1000, interval : float = 1., window : int = None,
+           alpha : float = None, chunk_size : int = CHUNK_SIZE):
+  '''
+  Compute progressive statistics of an unbounded stream of numbers.
+  The stream is read by a background thread in chunks of bounded size
+  into a bounded buffer, from which the values are parsed and reduced
+  incrementally. The current statistics are yielded every `every` records
+  or every `interval` seconds, whichever comes first, and at the end of
+  the stream. Tokens which are not numbers are skipped and counted.
+
+  Parameters
+  ----------
+  fp : file object
+    The binary input stream (e.g. sys.stdin.buffer). Values could be
+    separated by commas and/or newlines.
+
+  every : int, optional (default=1000)
+    The number of new records after which the statistics are yielded.
+
+  interval : float, optional (default=1.)
+    The number of seconds after which the statistics are yielded, if new
+    records were received.
+
+  window : int, optional (default=None)
+    If set, the statistics are computed on the last `window` records only.
+
+  alpha : float, optional (default=None)
+    If set, the statistics are exponentially weighted with decay factor
+    `alpha` (see ExponentialDecay).
+
+  chunk_size : int, optional (default=CHUNK_SIZE)
+    The maximum number of bytes read from the stream at each step.
+
+  Yields
+  ------
+  dict
+    The current statistics of the stream, together with the number of
+    skipped invalid tokens.
+  '''
+  if not isinstance(every, int) or every <= 0:
+    raise ValueError(f'every must be a positive integer')
+  if interval <= 0:
+    raise ValueError(f'interval must be positive')
+  if window is not None and alpha is not None:
+    raise ValueError(f'window and alpha are mutually exclusive')
+
+  if window is not None:
+    stats = SlidingWindow(window)
+  elif alpha is not None:
+    stats = ExponentialDecay(alpha)
+  else:
+    stats = Accumulator()
+
+  chunks = queue.Queue(maxsize=QUEUE_SIZE)
+  reader = threading.Thread(target=_read_chunks, args=(fp, chunks, chunk_size), daemon=True)
+  reader.start()
+
+  pending = 0
+  invalid = 0
+  last = monotonic()
+  eof = False
+
+  while not eof:
+    batch = []
+    # wait for the first chunk until the next deadline,
+    # then drain the chunks already buffered
+    try:
+      chunk = chunks.get(timeout=max(interval - (monotonic() - last), 0.))
+      while True:
+        if chunk is _EOF:
+          eof = True
+          break
+        if isinstance(chunk, Exception):
+          raise chunk
+        batch.append(chunk)
+        if len(batch) >= QUEUE_SIZE:
+          break
+        chunk = chunks.get_nowait()
+    except queue.Empty:
+      pass
+
+    x, skipped = _parse_valid(b''.join(batch))
+    invalid += skipped
+    # split the values at the boundaries of every `every` records
+    while len(x):
+      head, x = x[:every - pending], x[every - pending:]
+      stats.update(head)
+      pending += len(head)
+      if pending >= every:
+        yield dict(stats.to_dict(), invalid=invalid)
+        pending = 0
+        last = monotonic()
+
+    # emit the statistics if enough time has passed
+    if pending and (monotonic() - last >= interval or eof):
+      yield dict(stats.to_dict(), invalid=invalid)
+      pending = 0
+      last = monotonic()
+    elif not pending and monotonic() - last >= interval:
+      last = monotonic()
@@ -0,0 +1,73 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import struct
+import pytest
+import numpy as np
+from evalstats import EvalStats
+from evalstats import Accumulator
+from evalstats import tree_reduce
+
+__author__ = ['Nico Curti']
+__email__ = ['nico.curti2@unibo.it']
+
+
+def test_bytes_round_trip():
+  '''
+  Check that the binary encoding preserves all the fields.
+  '''
+  x = np.random.default_rng(42).normal(loc=3., scale=2., size=1000)
+  acc = Accumulator.from_array(x)
+  buffer = acc.to_bytes()
+
+  assert len(buffer) == struct.calcsize(Accumulator._FORMAT)
+  assert Accumulator.from_bytes(buffer) == acc
+  # the empty accumulator keeps its infinite extrema
+  assert Accumulator.from_bytes(Accumulator().to_bytes()) == Accumulator()
+
+
+@pytest.mark.parametrize('num_shards', [1, 2, 7, 64])
+def test_merge_shards(num_shards):
+  '''
+  Check that merging the partials of the shards gives the statistics
+  of the full array.
+  '''
+  x = np.random.default_rng(0).normal(loc=1e6, scale=3., size=10007)
+  shards = np.array_split(x, num_shards)
+
+  # sequential merge of the decoded partials, as done across hosts
+  partials = [
+    Accumulator.from_bytes(Accumulator.from_array(s).to_bytes())
+    for s in shards
+  ]
+  sequential = Accumulator()
+  for p in partials:
+    sequential = sequential.merge(p)
+
+  for acc in (sequential, tree_reduce(partials)):
+    stats = acc.to_dict()
+    assert stats['count'] == len(x)
+    assert np.isclose(stats['mean'], np.mean(x), rtol=0., atol=1e-9)
+    assert np.isclose(stats['variance'], np.var(x), rtol=1e-9)
+    assert stats['min'] == np.min(x)
+    assert stats['max'] == np.max(x)
+
+  # the same holds for the per-block partials of compute_all
+  stats = EvalStats(x, num_workers=num_shards).compute_all()
+  assert np.isclose(stats['variance'], np.var(x), rtol=1e-9)
+
+
+def test_from_bytes_rejects_invalid():
+  '''
+  Check that buffers with a wrong header or size are rejected.
+  '''
+  buffer = Accumulator.from_array([1., 2., 3.]).to_bytes()
+
+  with pytest.raises(ValueError):
+    Accumulator.from_bytes(b'XXXX' + buffer[4:])
+  with pytest.raises(ValueError):
+    Accumulator.from_bytes(buffer[:4] + bytes([Accumulator._VERSION + 1]) + buffer[5:])
+  with pytest.raises(ValueError):
+    Accumulator.from_bytes(buffer[:-1])
+  with pytest.raises(ValueError):
+    Accumulator.from_bytes(buffer + b'\x00')
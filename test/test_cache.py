@@ -0,0 +1,77 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+from evalstats import ResultCache
+from evalstats.cache import fingerprint_file
+
+__author__ = ['Nico Curti']
+__email__ = ['nico.curti2@unibo.it']
+
+
+def test_hit_and_miss_on_changed_file(tmp_path):
+  '''
+  Check that a cached result is served until the input file changes.
+  '''
+  cache = ResultCache(cache_dir=str(tmp_path / 'cache'))
+  filename = tmp_path / 'a.csv'
+  filename.write_text('1,2,3\n')
+
+  key = cache.make_key(inputs=[fingerprint_file(str(filename))], statistics=['mean'])
+  assert cache.get(key) is None
+  cache.put(key, {'mean': 2.})
+  assert cache.get(key) == {'mean': 2.}
+  assert cache.make_key(inputs=[fingerprint_file(str(filename))], statistics=['mean']) == key
+
+  # a new modification time gives a new key
+  info = os.stat(filename)
+  os.utime(filename, ns=(info.st_atime_ns, info.st_mtime_ns + 10 ** 9))
+  key = cache.make_key(inputs=[fingerprint_file(str(filename))], statistics=['mean'])
+  assert cache.get(key) is None
+
+
+def test_evict_least_recently_used(tmp_path):
+  '''
+  Check that the number of entries is capped and that the least recently
+  used entries are evicted first.
+  '''
+  cache = ResultCache(cache_dir=str(tmp_path), max_entries=10)
+  for i in range(10):
+    cache.put(f'k{i}', i)
+    # distinct access times, even on coarse filesystem clocks
+    os.utime(tmp_path / f'k{i}.json', ns=(i * 10 ** 9, i * 10 ** 9))
+  cache = ResultCache(cache_dir=str(tmp_path), max_entries=10)
+  # the first entry is used again, thus it is kept
+  assert cache.get('k0') == 0
+
+  cache.put('new', -1)
+  entries = sorted(os.listdir(tmp_path))
+  assert len(entries) <= 10
+  assert 'k0.json' in entries and 'new.json' in entries
+  assert 'k1.json' not in entries
+
+
+def test_read_only_hit(tmp_path, monkeypatch):
+  '''
+  Check that an entry is served even if its access time cannot be updated.
+  '''
+  cache = ResultCache(cache_dir=str(tmp_path))
+  cache.put('key', [1, 2])
+
+  def utime(*args, **kwargs):
+    raise PermissionError('read-only')
+  monkeypatch.setattr(os, 'utime', utime)
+  assert cache.get('key') == [1, 2]
+
+
+@pytest.mark.parametrize('value', [{'a': object()}, {1, 2}])
+def test_put_not_serializable(tmp_path, value):
+  '''
+  Check that values which cannot be stored are ignored without leaving
+  temporary files behind.
+  '''
+  cache = ResultCache(cache_dir=str(tmp_path))
+  cache.put('key', value)
+  assert cache.get('key') is None
+  assert os.listdir(tmp_path) == []
@@ -0,0 +1,55 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import sys
+import json
+import pytest
+import numpy as np
+from evalstats.__main__ import main
+
+__author__ = ['Nico Curti']
+__email__ = ['nico.curti2@unibo.it']
+
+
+def run(monkeypatch, capsys, *args) -> dict:
+  '''
+  Run the command line interface and return the printed statistics.
+  '''
+  monkeypatch.setattr(sys, 'argv', ['evalstats', '--no-cache', *args])
+  main()
+  return json.loads(capsys.readouterr().err)
+
+
+def test_merge_input_and_partials(tmp_path, monkeypatch, capsys):
+  '''
+  Check that the statistics of the input files are merged with the
+  partial statistics emitted by a previous run.
+  '''
+  rng = np.random.default_rng(1)
+  x, y = rng.normal(size=500), rng.normal(loc=2., size=300)
+
+  filename = tmp_path / 'a.csv'
+  np.savetxt(filename, x, delimiter=',')
+  partials = tmp_path / 'p.bin'
+  run(monkeypatch, capsys, '--data', *map(str, y.tolist()), '-e', str(partials), '--all')
+
+  stats = run(monkeypatch, capsys, '-i', str(filename), '-P', str(partials), '--all')
+  z = np.concatenate([x, y])
+  assert stats['count'] == len(z)
+  assert np.isclose(stats['mean'], np.mean(z))
+  assert np.isclose(stats['variance'], np.var(z))
+
+
+@pytest.mark.parametrize('options', [['-H', '0', '-R', '0', '1'], ['-H', '3', '-R', '2', '1']])
+def test_reject_invalid_histogram(tmp_path, monkeypatch, capsys, options):
+  '''
+  Check that invalid histogram options are reported before reading the
+  input files.
+  '''
+  filename = tmp_path / 'a.csv'
+  filename.write_text('1,2,3\n')
+  monkeypatch.setattr(sys, 'argv', ['evalstats', '--no-cache', '-i', str(filename), *options])
+  with pytest.raises(SystemExit):
+    main()
+  err = capsys.readouterr().err
+  assert 'Error!' in err and 'Cannot read' not in err
@@ -0,0 +1,106 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+import bz2
+import gzip
+import lzma
+import pytest
+import numpy as np
+from evalstats.reader import CODECS
+from evalstats.reader import expand_inputs
+from evalstats.reader import reduce_files
+from evalstats.reader import _reduce_file
+
+__author__ = ['Nico Curti']
+__email__ = ['nico.curti2@unibo.it']
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+  '''
+  Create a directory with supported and unsupported files.
+  '''
+  for f in ('a.csv', 'b.csv.gz', 'notes.txt'):
+    (tmp_path / f).write_bytes(b'1,2,3\n')
+  (tmp_path / 'sub.csv').mkdir()
+  return tmp_path
+
+
+def test_expand_inputs_filters_unsupported(data_dir):
+  '''
+  Check that directories and globs are expanded into the supported files.
+  '''
+  expected = [str(data_dir / 'a.csv'), str(data_dir / 'b.csv.gz')]
+  assert expand_inputs([str(data_dir)]) == expected
+  assert expand_inputs([str(data_dir / '*')]) == expected
+
+  with pytest.raises(FileNotFoundError):
+    expand_inputs([str(data_dir / '*.txt')])
+  with pytest.raises(FileNotFoundError):
+    expand_inputs([str(data_dir / 'missing.csv')])
+  with pytest.raises(ValueError):
+    expand_inputs([str(data_dir / 'notes.txt')])
+
+
+def test_expand_inputs_removes_duplicates(data_dir, monkeypatch):
+  '''
+  Check that the same file reached through different spellings is
+  listed only once, with the spelling of its first occurrence.
+  '''
+  monkeypatch.chdir(data_dir)
+  assert expand_inputs(['a.csv', './a.csv', os.path.abspath('a.csv')]) == ['a.csv']
+  assert expand_inputs(['.', '*.csv*']) == [os.path.join('.', 'a.csv'), os.path.join('.', 'b.csv.gz')]
+
+
+@pytest.mark.parametrize('ext', ['', '.gz', '.bz2', '.xz'])
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 16])
+def test_reduce_file(tmp_path, ext, chunk_size):
+  '''
+  Check that the pipeline gives the statistics of the file content for
+  every codec, even if the values are split across the chunks.
+  '''
+  x = np.random.default_rng(7).normal(loc=5., scale=2., size=(300, 3))
+  filename = str(tmp_path / f'data.csv{ext}')
+  with CODECS.get(ext, open)(filename, 'wt') as fp:
+    np.savetxt(fp, x, delimiter=',')
+
+  stats = _reduce_file(filename, chunk_size=chunk_size, queue_size=2).to_dict()
+  assert stats['count'] == x.size
+  assert np.isclose(stats['mean'], np.mean(x))
+  assert np.isclose(stats['variance'], np.var(x))
+  assert stats['min'] == np.min(x)
+  assert stats['max'] == np.max(x)
+
+
+def test_reduce_single_row(tmp_path):
+  '''
+  Check that a file without newlines is parsed correctly.
+  '''
+  x = np.arange(1000, dtype=np.float64)
+  filename = tmp_path / 'row.csv'
+  filename.write_text(','.join(map(str, x)))
+
+  stats = _reduce_file(str(filename), chunk_size=5).to_dict()
+  assert stats['count'] == len(x)
+  assert stats['sum'] == np.sum(x)
+
+
+@pytest.mark.parametrize('opener', [gzip.open, bz2.open, lzma.open])
+def test_reduce_corrupted(tmp_path, opener):
+  '''
+  Check that corrupted or truncated compressed files raise ValueError.
+  '''
+  ext = {gzip.open: '.gz', bz2.open: '.bz2', lzma.open: '.xz'}[opener]
+  filename = tmp_path / f'data.csv{ext}'
+  with opener(filename, 'wt') as fp:
+    fp.write('1,2,3\n' * 1000)
+  buffer = filename.read_bytes()
+
+  # garbage content and truncated stream
+  for content in (b'not compressed at all', buffer[:len(buffer) // 2]):
+    filename.write_bytes(content)
+    with pytest.raises(ValueError):
+      _reduce_file(str(filename), chunk_size=64)
+    with pytest.raises(ValueError):
+      reduce_files([str(filename)], num_workers=2)
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+from evalstats import EvalStats
+from evalstats import Histogram
+from evalstats import HyperLogLog
+from evalstats import Summary
+from evalstats import Accumulator
+
+__author__ = ['Nico Curti']
+__email__ = ['nico.curti2@unibo.it']
+
+
+def test_histogram():
+  '''
+  Check that merged histograms match np.histogram.
+  '''
+  x = np.random.default_rng(5).normal(size=5000)
+  hist = Histogram(bins=13, range=(-2., 2.))
+  for chunk in np.array_split(x, 3):
+    hist = hist.merge(Histogram(bins=13, range=(-2., 2.)).update(chunk))
+
+  counts, edges = np.histogram(x, bins=13, range=(-2., 2.))
+  assert hist.counts.tolist() == counts.tolist()
+  assert np.allclose(hist.edges, edges)
+
+  with pytest.raises(ValueError):
+    hist.merge(Histogram(bins=12, range=(-2., 2.)))
+  with pytest.raises(ValueError):
+    Histogram(bins=3, range=(0., np.inf))
+
+
+@pytest.mark.parametrize('n', [100, 10000, 200000])
+def test_hyperloglog(n):
+  '''
+  Check that the distinct count is within the expected error, also when
+  the sketches of overlapping sets are merged.
+  '''
+  precision = 12
+  x = np.random.default_rng(n).permutation(n).astype(np.float64)
+  a = HyperLogLog(precision).update(x[:2 * n // 3])
+  b = HyperLogLog(precision).update(x[n // 3:])
+  estimate = a.merge(b).estimate()
+  # four times the standard error of the sketch
+  assert abs(estimate - n) <= 4 * 1.04 / np.sqrt(1 << precision) * n
+
+
+@pytest.mark.parametrize('num_workers', [1, 3, 8])
+def test_scan_derived_range(num_workers):
+  '''
+  Check that the histogram range derived across the workers is the one
+  of the whole data.
+  '''
+  x = np.random.default_rng(num_workers).exponential(size=10001)
+  stats = EvalStats(x, num_workers=num_workers).scan(bins=9, precision=10)
+
+  counts, edges = np.histogram(x, bins=9)
+  assert stats['histogram']['counts'] == counts.tolist()
+  assert np.allclose(stats['histogram']['edges'], edges)
+  assert stats['count'] == len(x)
+  assert abs(stats['distinct'] - len(x)) <= 0.15 * len(x)
+
+
+@pytest.mark.parametrize('num_workers', [1, 2, 4])
+def test_scan_rejects_nan_range(num_workers):
+  '''
+  Check that a range derived from NaN values is always rejected.
+  '''
+  with pytest.raises(ValueError):
+    EvalStats([1., np.nan, 3., 4.], num_workers=num_workers).scan(bins=3)
+
+
+def test_summary_rejects_mismatched():
+  '''
+  Check that partials of different types are not merged.
+  '''
+  with pytest.raises(TypeError):
+    Summary().merge(Accumulator())
+  with pytest.raises(TypeError):
+    Accumulator().merge(Summary())
+  with pytest.raises(ValueError):
+    Summary(precision=8).merge(Summary())
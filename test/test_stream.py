@@ -0,0 +1,73 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import io
+import pytest
+import numpy as np
+from evalstats.stream import stream
+from evalstats.stream import SlidingWindow
+from evalstats.stream import ExponentialDecay
+
+__author__ = ['Nico Curti']
+__email__ = ['nico.curti2@unibo.it']
+
+
+@pytest.mark.parametrize('chunk_size', [3, 1 << 16])
+def test_stream_every(chunk_size):
+  '''
+  Check that the statistics are emitted exactly every N records, and at
+  the end of the stream.
+  '''
+  fp = io.BytesIO(b'\n'.join(str(i).encode() for i in range(1, 106)))
+  results = list(stream(fp, every=10, interval=60., chunk_size=chunk_size))
+
+  assert [r['count'] for r in results] == list(range(10, 101, 10)) + [105]
+  assert results[-1]['sum'] == sum(range(1, 106))
+  assert all(r['invalid'] == 0 for r in results)
+
+
+def test_stream_skips_invalid():
+  '''
+  Check that the tokens which are not numbers are counted and skipped.
+  '''
+  fp = io.BytesIO(b'value\n1\nfoo\n3,bar\n')
+  results = list(stream(fp, every=100, chunk_size=4))
+
+  assert results[-1]['count'] == 2
+  assert results[-1]['mean'] == 2.
+  assert results[-1]['invalid'] == 3
+
+
+@pytest.mark.parametrize('sizes', [[3, 4, 5], [1] * 12, [12], [25]])
+def test_sliding_window(sizes):
+  '''
+  Check that the window keeps the last values, wrapping around the ring
+  buffer.
+  '''
+  x = np.arange(sum(sizes), dtype=np.float64)
+  window = SlidingWindow(5)
+  for chunk in np.split(x, np.cumsum(sizes)[:-1]):
+    window.update(chunk)
+
+  stats = window.to_dict()
+  assert stats['count'] == 5
+  assert stats['mean'] == np.mean(x[-5:])
+  assert stats['min'] == x[-5] and stats['max'] == x[-1]
+
+
+def test_exponential_decay():
+  '''
+  Check that batched updates match the weighted statistics of the values.
+  '''
+  x = np.random.default_rng(3).normal(size=100)
+  alpha = 0.05
+  decay = ExponentialDecay(alpha)
+  for chunk in np.array_split(x, 7):
+    decay.update(chunk)
+
+  w = (1. - alpha) ** np.arange(len(x) - 1, -1, -1)
+  mean = np.sum(w * x) / np.sum(w)
+  stats = decay.to_dict()
+  assert np.isclose(stats['mean'], mean)
+  assert np.isclose(stats['variance'], np.sum(w * (x - mean) ** 2) / np.sum(w))
+  assert stats['count'] == len(x)